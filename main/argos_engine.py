@@ -0,0 +1,161 @@
+# Function: keep Argos translators warm for every en/de/zh direction
+# All pairs are resolved once at start (pairs without a direct package go through English),
+# so translate() only pays for inference instead of re-scanning packages and rebuilding the translator.
+# Every direction ("argos:de_en") is one CTranslate2 model that can be unloaded and loaded again on its own,
+# pairs through English share the models of their two steps (see model_residency.py).
+# translate_sentences() decodes several sentences in one CTranslate2 call per model (translate_batch with
+# Argos' own settings), for all sentences a pipeline has waiting (see reply_path.py).
+import gc
+import os
+import threading
+import time
+
+
+def package_translation(step):
+    # Argos wraps the model-backed PackageTranslation in a CachedTranslation
+    return getattr(step, "underlying", step)
+
+
+def package_backed(translation):
+    # argostranslate already chains missing pairs through another language itself (CompositeTranslation),
+    # only translations with their own package are used, the pivot is built here from those
+    return hasattr(package_translation(translation), "pkg")
+
+
+def model_steps_of(step):
+    # the package-backed translations a step runs, a CompositeTranslation (t1 then t2) is expanded
+    translation = package_translation(step)
+    if hasattr(translation, "t1") and hasattr(translation, "t2"):
+        return model_steps_of(translation.t1) + model_steps_of(translation.t2)
+    return [step]
+
+
+def step_name(step):
+    return f"argos:{step.from_lang.code}_{step.to_lang.code}"
+
+
+class ArgosTranslationEngine:
+    def __init__(self, language_codes, pivot_lang="en"):
+        self.language_codes = list(language_codes)
+        self.pivot_lang = pivot_lang
+        self.pairs = {}  # (source, target) -> list of Argos translations applied one after another
+        self.lock = threading.Lock()
+
+    def preload(self, warmup_text="Hello"):
+        t0 = time.time()
+        import argostranslate.translate  # pulls in ctranslate2, sentencepiece and stanza, so only when loading
+        installed = {lang.code: lang for lang in argostranslate.translate.get_installed_languages()}
+        with self.lock:
+            for source in self.language_codes:
+                for target in self.language_codes:
+                    if source == target:
+                        continue
+                    steps = self.resolve_pair(installed, source, target)
+                    if steps:
+                        self.pairs[(source, target)] = steps
+                        route = " -> ".join([source] + ([self.pivot_lang] if len(steps) > 1 else []) + [target])
+                        print(f"[Argos] Ready: {route}")
+                    else:
+                        print(f"[Argos] No translation available from {source} to {target}")
+        # the CTranslate2 model and sentencepiece tokenizer are only created on first use, do it now
+        if warmup_text:
+            for steps in self.pairs.values():
+                self.run_steps(steps, warmup_text)
+        print(f"[Argos] {len(self.pairs)} language pairs loaded in {time.time() - t0:.2f} seconds")
+
+    def resolve_pair(self, installed, source, target):
+        direct = self.direct_translation(installed, source, target)
+        if direct:
+            return [direct]
+        if self.pivot_lang in (source, target):
+            return None
+        first = self.direct_translation(installed, source, self.pivot_lang)
+        second = self.direct_translation(installed, self.pivot_lang, target)
+        if first and second:
+            return [first, second]
+        return None
+
+    def direct_translation(self, installed, source, target):
+        from_lang = installed.get(source)
+        to_lang = installed.get(target)
+        if not from_lang or not to_lang:
+            return None
+        translation = from_lang.get_translation(to_lang)
+        return translation if translation and package_backed(translation) else None
+
+    def model_steps(self):
+        # name -> translation step, every model once even if several pairs use it; only directions with their
+        # own package hold a model that can be measured and unloaded
+        return {step_name(model_step): model_step for steps in self.pairs.values() for step in steps
+                for model_step in model_steps_of(step) if package_backed(model_step)}
+
+    def step_names(self, source, target):
+        return [step_name(model_step) for step in self.pairs.get((source, target), [])
+                for model_step in model_steps_of(step)]
+
+    def unload_step(self, step):
+        model = package_translation(step)
+        if hasattr(model, "translator"):
+            model.translator = None  # Argos creates the CTranslate2 translator again on the next call
+        if hasattr(step, "cache"):
+            step.cache = {}  # otherwise a cached sentence would skip the reload in load_step()
+        gc.collect()
+
+    def load_step(self, step, warmup_text="Hello"):
+        step.translate(warmup_text)
+
+    def step_size_mb(self, step):
+        # the CTranslate2 weights are read into memory as they are, their file size is what the model takes
+        pkg = getattr(package_translation(step), "pkg", None)
+        if pkg is None:
+            return 0.0
+        model_dir = os.path.join(str(pkg.package_path), "model")
+        total = 0
+        for root, _, files in os.walk(model_dir):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return total / 1024 / 1024
+
+    def has_pair(self, source, target):
+        return (source, target) in self.pairs
+
+    def run_steps(self, steps, text):
+        for step in steps:
+            text = step.translate(text)
+        return text
+
+    def run_batch(self, step, sentences):
+        # what Argos does for one sentence (sentencepiece/BPE tokens, beam 4, length penalty 0.2), for all at once
+        model = package_translation(step)
+        pkg = getattr(model, "pkg", None)
+        tokenizer = getattr(pkg, "tokenizer", None)
+        if tokenizer is None:
+            return [step.translate(sentence) for sentence in sentences]  # older argostranslate without pkg.tokenizer
+        if getattr(model, "translator", None) is None:
+            self.load_step(step)  # first use or unloaded, Argos creates the CTranslate2 translator
+        tokens = [tokenizer.encode(sentence) for sentence in sentences]
+        prefix = getattr(pkg, "target_prefix", "")
+        results = model.translator.translate_batch(tokens, replace_unknowns=True, max_batch_size=32, beam_size=4,
+                                                   num_hypotheses=1, length_penalty=0.2,
+                                                   target_prefix=[[prefix]] * len(tokens) if prefix else None)
+        translations = []
+        for result in results:
+            text = tokenizer.decode(result.hypotheses[0]).strip()
+            if prefix and text.startswith(prefix):
+                text = text[len(prefix):].strip()
+            translations.append(text)
+        return translations
+
+    def translate_sentences(self, source, target, sentences):
+        steps = self.pairs.get((source, target))
+        if not steps:
+            return None
+        for step in steps:
+            for model_step in model_steps_of(step):
+                sentences = self.run_batch(model_step, sentences)
+        return sentences
+
+    def translate(self, source, target, text):
+        steps = self.pairs.get((source, target))
+        if not steps:
+            return f"Error: Argos translation not available from {source} to {target}."
+        return self.run_steps(steps, text)
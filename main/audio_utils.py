@@ -0,0 +1,110 @@
+# Function: helpers to hand microphone audio to whisper without going through a WAV file
+# Whisper wants mono float32 samples in [-1, 1] at 16 kHz, our mics record int16 at 48 kHz.
+import os
+import threading
+import wave
+import numpy as np
+
+WHISPER_SAMPLE_RATE = 16000
+
+
+def pcm16_to_float32(pcm, channels=1):
+    # np.frombuffer does not copy the captured bytes, only the conversion to float allocates
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples.astype(np.float32) / 32768.0
+
+
+def lowpass_taps(cutoff, num_taps=63):
+    # windowed-sinc low-pass filter, cutoff is relative to the input sample rate (0 - 0.5)
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = np.sinc(2 * cutoff * n) * np.hamming(num_taps)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+def resample(audio, from_rate, to_rate):
+    if from_rate == to_rate or len(audio) == 0:
+        return audio
+    if from_rate > to_rate:
+        # remove everything above the new Nyquist frequency before dropping samples
+        audio = np.convolve(audio, lowpass_taps(0.45 * to_rate / from_rate), mode="same").astype(np.float32)
+        if from_rate % to_rate == 0:
+            return audio[::from_rate // to_rate]  # 48 kHz -> 16 kHz is a plain 3:1 decimation
+    duration = len(audio) / from_rate
+    new_times = np.arange(int(duration * to_rate)) / to_rate
+    old_times = np.arange(len(audio)) / from_rate
+    return np.interp(new_times, old_times, audio).astype(np.float32)
+
+
+class StreamResampler:
+    # linear interpolation that keeps its phase from one chunk to the next, for audio that arrives in
+    # pieces (streaming TTS); resampling every chunk on its own would click at the chunk borders
+    def __init__(self, from_rate, to_rate):
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self.step = from_rate / to_rate
+        self.position = 0.0  # of the next output sample, in input samples counted from the start of self.tail
+        self.tail = np.zeros(0, dtype=np.float32)
+
+    def process(self, audio):
+        if self.from_rate == self.to_rate:
+            return audio
+        data = np.concatenate((self.tail, audio))
+        if len(data) - 1 < self.position:
+            self.tail = data
+            return np.zeros(0, dtype=np.float32)
+        count = int((len(data) - 1 - self.position) / self.step) + 1
+        positions = self.position + np.arange(count) * self.step
+        out = np.interp(positions, np.arange(len(data)), data).astype(np.float32)
+        next_position = self.position + count * self.step
+        keep = int(next_position)
+        self.tail = data[keep:]
+        self.position = next_position - keep
+        return out
+
+
+def pcm16_to_whisper(pcm, sample_rate, channels=1):
+    return resample(pcm16_to_float32(pcm, channels), sample_rate, WHISPER_SAMPLE_RATE)
+
+
+def wav_to_whisper(filepath):
+    # 16-bit WAV file as whisper input, without openai-whisper's ffmpeg loader (and its torch import)
+    with wave.open(filepath, "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{filepath}: only 16-bit PCM WAVs are supported")
+        pcm = wf.readframes(wf.getnframes())
+        return pcm16_to_whisper(pcm, wf.getframerate(), wf.getnchannels())
+
+
+def trim_silence(audio, sample_rate=WHISPER_SAMPLE_RATE, threshold=0.01, margin_seconds=0.2, frame_seconds=0.02):
+    # cut the quiet start and end of a push-to-talk clip (button pressed before speaking, released after),
+    # a margin is kept so soft word onsets survive; a clip that is silent throughout is returned as it is
+    frame = int(sample_rate * frame_seconds)
+    count = len(audio) // frame
+    if count == 0:
+        return audio
+    rms = np.sqrt(np.mean(np.square(audio[:count * frame].reshape(count, frame)), axis=1))
+    loud = np.flatnonzero(rms > threshold)
+    if len(loud) == 0:
+        return audio
+    margin = int(sample_rate * margin_seconds)
+    start = max(0, loud[0] * frame - margin)
+    end = min(len(audio), (loud[-1] + 1) * frame + margin)
+    return audio[start:end]
+
+
+def write_wav(filepath, pcm, sample_rate, channels=1):
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with wave.open(filepath, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)  # int16
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+
+
+def write_wav_async(filepath, pcm, sample_rate, channels=1):
+    # archiving is not needed for the translation, keep the SD card write off the critical path
+    thread = threading.Thread(target=write_wav, args=(filepath, pcm, sample_rate, channels), daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,216 @@
+# Function: replay recorded WAVs through STT -> translation -> TTS without buttons, mics or speakers
+# Uses the same resident models, the same SentencePipeline and the same reply path (translation memory, batched
+# Argos, TTS cache, streaming piper; see reply_path.py) as button4312_Argos_friday.py, configured by the same
+# environment variables. Playback goes to a null sink. Prints per-stage p50/p95, real-time factor and peak RSS,
+# plus WER/BLEU when references exist, and writes everything as JSON so runs can be compared.
+#
+# Reference files next to each recording (both optional):
+#   hello.wav       the recording
+#   hello.txt       reference transcript in the source language
+#   hello.de.txt    reference translation in the target language
+#
+# How to run (from main/):
+#   python3 benchmark.py ../guest_mic_recordings --source en --target de --output ../bench_output.json
+#   STT_BACKEND=ctranslate2 STT_INTRA_THREADS=4 python3 benchmark.py ../corpus --source de --target en
+#   python3 benchmark.py ../corpus --no-cache   (cold numbers: no translation memory, no TTS cache)
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+import wave
+from audio_utils import pcm16_to_whisper
+from eval_metrics import corpus_bleu, word_error_rate
+from memory_usage import get_peak_rss_mb, get_rss_mb
+from metrics import Histogram
+from pipeline import SentencePipeline
+
+STAGES = ("stt", "translation", "tts", "playback_start", "end_to_end")
+
+
+def read_reference(path):
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    return None
+
+
+def load_wav(path):
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAVs are supported")
+        pcm = wf.readframes(wf.getnframes())
+        return pcm, wf.getframerate(), wf.getnchannels()
+
+
+def null_playback(pcm, sample_rate, device):
+    # no speaker on the build server, the pipeline still records when playback would start
+    if not isinstance(pcm, (bytes, bytearray)):
+        for _ in pcm:
+            pass  # a streamed reply is only synthesized while it is read
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay WAV recordings through STT, translation and TTS")
+    parser.add_argument("folder", nargs="?", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "guest_mic_recordings"))
+    parser.add_argument("--source", default="en", help="language spoken in the recordings")
+    parser.add_argument("--target", default="de", help="language to translate into")
+    parser.add_argument("--stt-size", default=os.environ.get("STT_MODEL_SIZE", "tiny"))
+    parser.add_argument("--stt-backend", default=os.environ.get("STT_BACKEND", "whisper"))
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads for STT (torch / CTranslate2)")
+    parser.add_argument("--no-tts", action="store_true", help="skip Piper, e.g. on machines without the binary")
+    parser.add_argument("--no-cache", action="store_true", help="no translation memory and no TTS cache")
+    parser.add_argument("--limit", type=int, default=None, help="only the first N recordings")
+    parser.add_argument("--output", default=None, help="write the JSON results here instead of stdout")
+    return parser.parse_args()
+
+
+def run_benchmark(args):
+    if args.threads:
+        os.environ["STT_INTRA_THREADS"] = str(args.threads)
+        if args.stt_backend == "whisper":
+            import torch  # the CTranslate2 backend reads STT_INTRA_THREADS and does not need torch
+            torch.set_num_threads(args.threads)
+
+    files = sorted(glob.glob(os.path.join(args.folder, "*.wav")))[:args.limit]
+    if not files:
+        raise SystemExit(f"No WAV files found in {args.folder}")
+
+    # the heavy imports come after argument parsing so --help stays fast
+    from argos_engine import ArgosTranslationEngine
+    from model_residency import ModelResidency
+    from piper_workers import PiperWorkerPool
+    from reply_path import ReplyPath
+    from stt_models import STTModelRegistry
+    from translation_memory import TRANSLATION_MEMORY_PATH, TranslationMemory
+    from tts_cache import TTS_CACHE_DIR, TTSCache
+
+    rss_start = get_rss_mb()
+    t_load = time.time()
+    stt = STTModelRegistry(backend=args.stt_backend)
+    model = stt.get(args.stt_size)
+    engine = ArgosTranslationEngine([args.source, args.target])
+    engine.preload()
+    memory = None
+    if not args.no_cache and os.environ.get("TRANSLATION_MEMORY", "1") == "1":
+        memory = TranslationMemory(path=os.environ.get("TRANSLATION_MEMORY_PATH", TRANSLATION_MEMORY_PATH),
+                                   max_entries=int(os.environ.get("TRANSLATION_MEMORY_SIZE", "20000")),
+                                   fuzzy=os.environ.get("TRANSLATION_MEMORY_FUZZY", "1") == "1")
+        memory.load()
+    cache = None
+    if not args.no_cache and os.environ.get("TTS_CACHE", "1") == "1":
+        cache = TTSCache(folder=os.environ.get("TTS_CACHE_DIR", TTS_CACHE_DIR),
+                         memory_bytes=int(os.environ.get("TTS_CACHE_MEMORY_MB", "32")) * 1024 * 1024,
+                         disk_bytes=int(os.environ.get("TTS_CACHE_DISK_MB", "512")) * 1024 * 1024)
+        cache.load_index()
+    pool = None
+    if not args.no_tts:
+        pool = PiperWorkerPool(streaming=os.environ.get("STREAMING_TTS", "1") == "1")
+        pool.start()
+    replies = ReplyPath(engine, pool, ModelResidency(), translation_memory=memory, tts_cache=cache,
+                        batch_window_seconds=float(os.environ.get("TRANSLATION_BATCH_WINDOW_MS", "0")) / 1000.0,
+                        max_batch=int(os.environ.get("TRANSLATION_MAX_BATCH", "16")))
+    if pool:
+        synthesize = replies.synthesize_speech
+    else:
+        synthesize = lambda text, lang: (b"", 22050)
+    load_seconds = time.time() - t_load
+    model_rss = get_rss_mb() - rss_start  # piper runs in its own processes and is not included
+
+    latency = Histogram("benchmark_stage_seconds", "benchmark", labels=("stage",), window=100000)
+    results = []
+    total_audio = 0.0
+    total_stt = 0.0
+    total_processing = 0.0
+    try:
+        for path in files:
+            pcm, sample_rate, channels = load_wav(path)
+            audio_seconds = len(pcm) / (2 * channels * sample_rate)
+            base = os.path.splitext(path)[0]
+
+            t0 = time.time()
+            audio = pcm16_to_whisper(pcm, sample_rate, channels)
+            recognized = model.transcribe(audio, language=args.source)["text"].strip()
+            t1 = time.time()
+            pipeline = SentencePipeline(args.source, args.target, None, replies.translate_sentences, synthesize, null_playback,
+                                        hold_playback=False)
+            pipeline.submit(recognized)
+            translation = pipeline.wait()
+            t2 = time.time()
+
+            stages = {"stt": t1 - t0,
+                      "translation": pipeline.stage_times["translation"],
+                      "tts": pipeline.stage_times["tts"],
+                      "playback_start": (pipeline.first_audio - t0) if pipeline.first_audio else None,
+                      "end_to_end": t2 - t0}
+            for stage, value in stages.items():
+                if value is not None:
+                    latency.observe(value, stage=stage)
+            total_audio += audio_seconds
+            total_stt += stages["stt"]
+            total_processing += stages["end_to_end"]
+
+            entry = {"file": os.path.basename(path), "audio_seconds": round(audio_seconds, 3),
+                     "recognized": recognized, "translation": translation,
+                     "stages": {k: (round(v, 4) if v is not None else None) for k, v in stages.items()}}
+            ref_text = read_reference(base + ".txt")
+            ref_translation = read_reference(f"{base}.{args.target}.txt")
+            if ref_text is not None:
+                entry["wer"] = round(word_error_rate(ref_text, recognized, args.source), 4)
+                entry["reference"] = ref_text
+            if ref_translation is not None:
+                entry["reference_translation"] = ref_translation
+            results.append(entry)
+            print(f"{entry['file']}: {audio_seconds:.2f}s audio, STT {stages['stt']:.2f}s, "
+                  f"total {stages['end_to_end']:.2f}s")
+    finally:
+        replies.close()
+        if pool:
+            pool.stop()
+        if memory:
+            memory.close()
+
+    summary = {"files": len(results),
+               "audio_seconds": round(total_audio, 3),
+               "model_load_seconds": round(load_seconds, 3),
+               "model_rss_mb": round(model_rss, 1),
+               "peak_rss_mb": round(get_peak_rss_mb(), 1),
+               "stt_rtf": round(total_stt / total_audio, 4) if total_audio else None,
+               "end_to_end_rtf": round(total_processing / total_audio, 4) if total_audio else None,
+               "stages": {}}
+    for stage in STAGES:
+        q = latency.quantiles((0.5, 0.95), stage=stage)
+        summary["stages"][stage] = {"p50": q[0.5], "p95": q[0.95]}
+    scored = [r for r in results if "wer" in r]
+    if scored:
+        summary["wer"] = round(sum(r["wer"] for r in scored) / len(scored), 4)
+    translated = [r for r in results if "reference_translation" in r]
+    if translated:
+        summary["bleu"] = round(corpus_bleu([r["reference_translation"] for r in translated],
+                                            [r["translation"] for r in translated], args.target), 2)
+
+    return {"config": {"folder": os.path.abspath(args.folder), "source": args.source, "target": args.target,
+                         "stt_backend": args.stt_backend, "stt_size": args.stt_size, "threads": args.threads,
+                         "compute_type": os.environ.get("STT_COMPUTE_TYPE"), "tts": not args.no_tts,
+                         "cache": not args.no_cache, "streaming_tts": pool.streaming if pool else None},
+              "summary": summary,
+              "results": results}
+
+
+def main():
+    args = parse_args()
+    with contextlib.redirect_stdout(sys.stderr):  # model and pipeline logs must not end up in the JSON
+        report = run_benchmark(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
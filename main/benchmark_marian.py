@@ -0,0 +1,135 @@
+# Function: compare the MarianMT backends (PyTorch FP32 vs CTranslate2 int8) on the same sentences
+# Each backend runs in its own process so the RSS numbers are not mixed up. Reports model load time,
+# model RSS, per-sentence latency p50/p95 and BLEU against reference translations, as JSON.
+#
+# The corpus is a UTF-8 text file, one sentence per line, reference translation after a tab (optional):
+#   Where is the train station?<TAB>Wo ist der Bahnhof?
+#
+# How to run (from main/, convert the CTranslate2 models first with convert_marian_ct2.py):
+#   python3 benchmark_marian.py ../corpus/en_de.tsv --source en --target de --threads 4 --output ../bench_output.json
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+from eval_metrics import corpus_bleu
+from memory_usage import get_peak_rss_mb, get_rss_mb
+from metrics import Histogram
+
+BACKENDS = ("pytorch", "ctranslate2")
+
+
+def read_corpus(path, limit=None):
+    sentences, references = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            source, _, reference = line.rstrip("\n").partition("\t")
+            sentences.append(source.strip())
+            references.append(reference.strip() or None)
+    return sentences[:limit], references[:limit]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare MarianMT backends on latency, RSS and BLEU")
+    parser.add_argument("corpus", help="sentences, optionally with a tab and the reference translation")
+    parser.add_argument("--source", default="en")
+    parser.add_argument("--target", default="de")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads for torch / CTranslate2")
+    parser.add_argument("--limit", type=int, default=None, help="only the first N sentences")
+    parser.add_argument("--output", default=None, help="write the JSON results here instead of stdout")
+    parser.add_argument("--single", default=None, help=argparse.SUPPRESS)  # one backend, used by the parent process
+    return parser.parse_args()
+
+
+def run_backend(args):
+    from marian_engine import create_marian_engine
+
+    sentences, references = read_corpus(args.corpus, args.limit)
+    if not sentences:
+        raise SystemExit(f"No sentences in {args.corpus}")
+    rss_start = get_rss_mb()
+    t_load = time.time()
+    # one sentence at a time, without the batch window in the measured latency
+    engine = create_marian_engine([args.source, args.target], backend=args.single, num_threads=args.threads,
+                                  batch_window_ms=0)
+    if not engine.route(args.source, args.target):
+        raise SystemExit(f"No {args.single} model for {args.source} -> {args.target}")
+    load_seconds = time.time() - t_load
+    model_rss = get_rss_mb() - rss_start
+    engine.translate(args.source, args.target, sentences[0])  # first call allocates the buffers
+
+    latency = Histogram("marian_sentence_seconds", "benchmark", window=100000)
+    translations = []
+    t_start = time.time()
+    for sentence in sentences:
+        t0 = time.time()
+        translations.append(engine.translate(args.source, args.target, sentence))
+        latency.observe(time.time() - t0)
+    total = time.time() - t_start
+
+    q = latency.quantiles((0.5, 0.95))
+    result = {"backend": args.single,
+              "sentences": len(sentences),
+              "model_load_seconds": round(load_seconds, 3),
+              "model_rss_mb": round(model_rss, 1),
+              "peak_rss_mb": round(get_peak_rss_mb(), 1),
+              "latency": {"p50": q[0.5], "p95": q[0.95], "mean": round(total / len(sentences), 4)},
+              "translations": translations}
+    scored = [(r, t) for r, t in zip(references, translations) if r is not None]
+    if scored:
+        result["bleu"] = round(corpus_bleu([r for r, _ in scored], [t for _, t in scored], args.target), 2)
+    return result
+
+
+def compare(args):
+    results = {}
+    for backend in args.backends:
+        command = [sys.executable, os.path.abspath(__file__), args.corpus, "--source", args.source,
+                   "--target", args.target, "--single", backend]
+        if args.threads:
+            command += ["--threads", str(args.threads)]
+        if args.limit:
+            command += ["--limit", str(args.limit)]
+        print(f"Running {backend}...", file=sys.stderr)
+        process = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+        if process.returncode != 0:
+            print(f"{backend} failed (exit code {process.returncode})", file=sys.stderr)
+            continue
+        results[backend] = json.loads(process.stdout)
+
+    for backend, result in results.items():
+        print(f"{backend:12s} p50 {result['latency']['p50']:.3f}s  p95 {result['latency']['p95']:.3f}s  "
+              f"model {result['model_rss_mb']:.0f} MB  BLEU {result.get('bleu', '-')}", file=sys.stderr)
+    if len(results) == len(BACKENDS):
+        torch, ct2 = results["pytorch"], results["ctranslate2"]
+        agree = sum(a == b for a, b in zip(torch["translations"], ct2["translations"]))
+        print(f"CTranslate2 is {torch['latency']['p50'] / ct2['latency']['p50']:.1f}x faster (p50), "
+              f"{agree}/{len(ct2['translations'])} translations identical", file=sys.stderr)
+    return {"config": {"corpus": os.path.abspath(args.corpus), "source": args.source, "target": args.target,
+                       "threads": args.threads},
+            "backends": results}
+
+
+def main():
+    args = parse_args()
+    if args.single:
+        with contextlib.redirect_stdout(sys.stderr):  # model logs must not end up in the JSON
+            report = run_backend(args)
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    text = json.dumps(compare(args), ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
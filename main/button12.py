@@ -7,10 +7,12 @@ import glob
 import subprocess
 import pyaudio
 import wave
-import whisper
+from stt_models import stt_registry
 import warnings
 warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
 
+WHISPER_MODEL_SIZE = "tiny"  # loaded once at start, shared by both mics
+
 
 BUTTON1_PIN = 27 #button1
 BUTTON2_PIN = 22 #button2
@@ -141,7 +143,7 @@ def button1_released():
             language = input("Enter source language code: ").strip().lower()
 
             print(f"Transcribing with tiny model using language: {language}") #using whisper(tiny) for speech2text
-            model = whisper.load_model("tiny", device="cpu")
+            model = stt_registry.get(WHISPER_MODEL_SIZE)
             result = model.transcribe(latest_file, language=language)
             print("Recognized text:", result["text"])
 
@@ -183,7 +185,7 @@ def button2_released():
             language = input("Enter source language code: ").strip().lower()
 
             print(f"Transcribing with tiny model using language: {language}") #using whisper(tiny) for speech2text
-            model = whisper.load_model("tiny", device="cpu")
+            model = stt_registry.get(WHISPER_MODEL_SIZE)
             result = model.transcribe(latest_file, language=language)
             print("Recognized text:", result["text"])
 
@@ -192,6 +194,9 @@ def button2_released():
         # --- Whisper integration ends here ---
 
 
+# Load whisper once before accepting button presses
+stt_registry.preload([WHISPER_MODEL_SIZE])
+
 #gpiozero 
 button1.when_pressed = button1_pressed
 button1.when_released = button1_released
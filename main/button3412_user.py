@@ -10,12 +10,14 @@ import glob
 import subprocess
 import pyaudio
 import wave
-import whisper
+from stt_models import stt_registry
 import warnings
 from transformers import MarianMTModel, MarianTokenizer
 
 warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
 
+WHISPER_MODEL_SIZE = "tiny"  # loaded once at start, shared by both mics
+
 # Button pin definitions
 BUTTON1_PIN = 27  # button1 - guest mic
 BUTTON2_PIN = 22  # button2 - user mic
@@ -240,7 +242,7 @@ def button1_released():
             source = selected_langs['source']
             target = selected_langs['target']
             print(f"Transcribing ({source})...")
-            model = whisper.load_model("tiny", device="cpu")
+            model = stt_registry.get(WHISPER_MODEL_SIZE)
             result = model.transcribe(latest_file, language=source)
             recognized = result["text"].strip()
             print("Recognized text:", recognized)
@@ -288,7 +290,7 @@ def button2_released():
             source = selected_langs['target']  # button2ss target language and source language are opposite with button1's
             target = selected_langs['source']
             print(f"Transcribing ({source})...")
-            model = whisper.load_model("tiny", device="cpu")
+            model = stt_registry.get(WHISPER_MODEL_SIZE)
             result = model.transcribe(latest_file, language=source)
             recognized = result["text"].strip()
             print("Recognized text:", recognized)
@@ -303,6 +305,9 @@ def button2_released():
             print(f"Error in transcription, translation, or TTS: {e}")
 
 
+# Load whisper once before accepting button presses
+stt_registry.preload([WHISPER_MODEL_SIZE])
+
 # gpiozero button binding
 button1.when_pressed = button1_pressed
 button1.when_released = button1_released
@@ -10,13 +10,15 @@ import glob
 import subprocess
 import pyaudio
 import wave
-import whisper
+from stt_models import stt_registry
 import warnings
 import argostranslate.package
 import argostranslate.translate
 
 warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
 
+WHISPER_MODEL_SIZE = "tiny"  # loaded once at start, shared by both mics
+
 # Button pin definitions
 BUTTON1_PIN = 27  # button1 - guest mic
 BUTTON2_PIN = 22  # button2 - user mic
@@ -343,7 +345,7 @@ def button1_released():
 
             t0 = time.time()
             print(f"Transcribing ({source})...")
-            model = whisper.load_model("tiny", device="cpu")
+            model = stt_registry.get(WHISPER_MODEL_SIZE)
             result = model.transcribe(latest_file, language=source)
             recognized = result["text"].strip()
             t1 = time.time()
@@ -430,7 +432,7 @@ def button2_released():
 
             t0 = time.time()
             print(f"Transcribing ({source})...")
-            model = whisper.load_model("tiny", device="cpu")
+            model = stt_registry.get(WHISPER_MODEL_SIZE)
             result = model.transcribe(latest_file, language=source)
             recognized = result["text"].strip()
             t1 = time.time()
@@ -452,6 +454,9 @@ def button2_released():
         except Exception as e:
             print(f"Error in transcription, translation, or TTS: {e}")
 
+# Load whisper once before accepting button presses
+stt_registry.preload([WHISPER_MODEL_SIZE])
+
 # gpiozero button binding
 button1.when_pressed = button1_pressed
 button1.when_released = button1_released
@@ -2,33 +2,57 @@
 # And then Button1 function or Button2 function using gpiozero to record sounds
 # will use 2 sets of specific hardwares to record and replay the translation
 # How to test? 1. activate virtual env 2. connect 4 buttons rightly 3. run test
+from startup import StartupSequence  # first, its clock starts at import
 from gpiozero import Button
 import threading
 import time
 import os
-import glob
-import subprocess
-import pyaudio
+import functools
 import wave
-import whisper
+from stt_models import stt_registry
 import warnings
-import argostranslate.package
-import argostranslate.translate
+from argos_engine import ArgosTranslationEngine
+from piper_workers import PiperWorkerPool
+from audio_utils import pcm16_to_whisper, write_wav_async
+from capture_engine import CaptureEngine
+from streaming_stt import StreamingTranscriber
+from pipeline import SentencePipeline
+from metrics import stage_latency, start_metrics_server
+from channel_scheduler import ChannelWorker, FairScheduler, ScheduledModel
+from output_engine import OutputDevice, OutputEngine
+from prompt_bank import PromptBank
+from tts_cache import TTS_CACHE_DIR, TTSCache
+from translation_memory import TRANSLATION_MEMORY_PATH, TranslationMemory
+from model_residency import ModelResidency
+from reply_path import ReplyPath
 
 warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
 
+# GPIO and the prompt come up first, the models load in the background (see startup.py)
+startup = StartupSequence()
+startup.record("imports", time.time() - startup.t_start)
+
+WHISPER_MODEL_SIZE = os.environ.get("STT_MODEL_SIZE", "tiny")  # loaded once at start, shared by both mics
+
+# Run without GPIO and sound cards (mock pins, WAV files as mics, null/file speakers), see simulation.py
+SIMULATION = os.environ.get("OFFLINE_TRANSLATOR_SIMULATION", "0") == "1"
+SIMULATION_SCENARIO = os.environ.get("SIMULATION_SCENARIO")  # button timeline to play, otherwise wait forever
+if SIMULATION:
+    import simulation
+    simulation.use_mock_pins()  # must happen before the Buttons are created
+
 # Button pin definitions
 BUTTON1_PIN = 27  # button1 - guest mic
 BUTTON2_PIN = 22  # button2 - user mic
 BUTTON3_PIN = 20  # button3 - select source language
 BUTTON4_PIN = 21  # button4 - select target language
 
-button1 = Button(BUTTON1_PIN, pull_up=True, bounce_time=0.2)
-button2 = Button(BUTTON2_PIN, pull_up=True, bounce_time=0.2)
-button3 = Button(BUTTON3_PIN)
-button4 = Button(BUTTON4_PIN)
+with startup.stage("gpio"):
+    button1 = Button(BUTTON1_PIN, pull_up=True, bounce_time=0.2)
+    button2 = Button(BUTTON2_PIN, pull_up=True, bounce_time=0.2)
+    button3 = Button(BUTTON3_PIN)
+    button4 = Button(BUTTON4_PIN)
 
-system_locked_by = None 
 # For Button1 (Guest Mic) long-press confirmation
 guest_button_confirmed = False
 guest_record_start_time = None
@@ -54,53 +78,46 @@ audio_map = {
     'error': os.path.join(os.path.dirname(__file__), '../languages/error.wav')
 }
 
-current_audio_process = None
-current_audio_owner = None 
-interrupt_whitelist = set()
+# Speakers stay open for the whole run, prompts and replies are queued into them (see output_engine.py)
+GUEST_SPEAKER = "plughw:CARD=USB,DEV=0"
+USER_SPEAKER = "plughw:CARD=Device,DEV=0"
+PROMPT_SPEAKER = GUEST_SPEAKER  # language prompts play on the guest side
+
+if SIMULATION:
+    speaker_class = functools.partial(simulation.SimulatedOutputDevice, mode=os.environ.get("SIMULATION_OUTPUT", "null"))
+else:
+    speaker_class = OutputDevice
+output_engine = OutputEngine([GUEST_SPEAKER, USER_SPEAKER], device_class=speaker_class)
+with startup.stage("speakers"):
+    output_engine.open()
+prompt_speaker = output_engine.get(PROMPT_SPEAKER)
+
+# every prompt is read and converted to the speakers' format once, presses play from memory (see prompt_bank.py)
+prompt_bank = PromptBank(audio_map, output_engine.devices.values())
+with startup.stage("prompts"):
+    prompt_bank.load()
 
 def play_audio(lang_code, owner=None, allow_interrupt_from=None):
-    global current_audio_process, current_audio_owner, interrupt_whitelist
-
-    path = audio_map.get(lang_code)
-    if path and os.path.exists(path):
-        print(f"Playing audio: {path}")
-
-        if current_audio_process and current_audio_process.poll() is None:
-            current_audio_process.terminate()
-            print(f"Previous audio interrupted. Owner was {current_audio_owner}")
+    if prompt_bank.has(lang_code, prompt_speaker):
+        print(f"Playing audio: {lang_code}")
 
-        current_audio_owner = owner
-        interrupt_whitelist = set(allow_interrupt_from or [])
-        current_audio_process = subprocess.Popen(['aplay', '-D', 'plughw:CARD=USB,DEV=0', path])
+        previous_owner = prompt_speaker.owner()
+        if prompt_speaker.stop("prompt"):
+            print(f"Previous audio interrupted. Owner was {previous_owner}")
 
-        # Start monitor thread to clear owner when playback finishes
-        threading.Thread(target=monitor_audio_completion, args=(owner,), daemon=True).start()
+        # the owner is cleared by itself when the clip ends, no monitor thread needed
+        prompt_bank.play(lang_code, prompt_speaker, owner=owner, allow_interrupt_from=allow_interrupt_from)
 
     else:
-        print(f"Audio file not found: {path}")
+        print(f"Audio file not found: {audio_map.get(lang_code)}")
 
-def monitor_audio_completion(owner_to_clear):
-    global current_audio_process, current_audio_owner
 
-    if current_audio_process:
-        current_audio_process.wait()  # block until playback ends
-        print(f"Audio playback by {owner_to_clear} completed.")
-        if current_audio_owner == owner_to_clear:
-            current_audio_owner = None
-            print("Audio owner cleared. Button1/2 can now record.")
+def current_audio_owner():
+    return prompt_speaker.owner()
 
 
 def interrupt_audio_playback(caller):
-    global current_audio_process, current_audio_owner, interrupt_whitelist
-    if current_audio_process and current_audio_process.poll() is None:
-        if caller in interrupt_whitelist:
-            current_audio_process.terminate()
-            print(f"Audio interrupted by {caller}. Previous owner was {current_audio_owner}")
-            return True
-        else:
-            print(f"Caller {caller} not allowed to interrupt current playback from {current_audio_owner}")
-            return False
-    return True  # nothing is playing, so allow
+    return prompt_speaker.interrupt(caller)
 
 
 
@@ -114,10 +131,8 @@ play_audio("default", owner=None, allow_interrupt_from=["button1", "button2", "b
 
 # Button4
 def select_target():
-    global system_locked_by  
-
-    if system_locked_by and system_locked_by != "button4":
-        print(f"System is locked by {system_locked_by}. Button4 cannot operate.")
+    if guest_recorder.is_recording or user_recorder.is_recording:
+        print("A microphone is recording. Button4 cannot operate.")
         return
 
     if not interrupt_audio_playback("button4"):
@@ -127,15 +142,14 @@ def select_target():
     target_index = (target_index + 1) % len(language_codes)
     selected_langs['target'] = language_codes[target_index]
     print(f"Selected target language: {selected_langs['target']}")
+    pin_selected_models()
     play_audio(f"t_{selected_langs['target']}", owner="button4", allow_interrupt_from=["button4"])
 #play target languages' audioes, couldn't be interrupted by any other button expect itself
     
 # Button3
 def select_source():
-    global system_locked_by 
-
-    if system_locked_by and system_locked_by != "button3":
-        print(f"System is locked by {system_locked_by}. Button3 cannot operate.")
+    if guest_recorder.is_recording or user_recorder.is_recording:
+        print("A microphone is recording. Button3 cannot operate.")
         return
 
     if not interrupt_audio_playback("button3"):
@@ -155,165 +169,279 @@ def select_source():
     source_index = language_codes.index(selected_langs['source'])
 
     print(f"Selected source language: {selected_langs['target']}_{selected_langs['source']}")
+    pin_selected_models()
     play_audio(f"{selected_langs['target']}_{selected_langs['source']}", owner="button3", allow_interrupt_from=["button3"])
 # couldn't be interrupted by any other button expect itself
 
 
-#Argos
-def translate_text(source_lang_code, target_lang_code, text):
-    installed_languages = argostranslate.translate.get_installed_languages()
-    from_lang = next((lang for lang in installed_languages if lang.code == source_lang_code), None)
-    to_lang = next((lang for lang in installed_languages if lang.code == target_lang_code), None)
+#Argos, all pairs are loaded once at start (see argos_engine.py)
+translation_engine = ArgosTranslationEngine(language_codes)
+
+# Above MODEL_MEMORY_BUDGET_MB the least recently used directions and voices are unloaded and loaded again
+# when needed, the selected pair is pinned (see model_residency.py)
+residency = ModelResidency(budget_mb=float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "0")))
+
+def pin_selected_models():
+    source, target = selected_langs['source'], selected_langs['target']
+    names = translation_engine.step_names(source, target) + translation_engine.step_names(target, source)
+    residency.pin(names + [f"piper:{source}", f"piper:{target}"])
+
+# Sentences that were translated before are answered from the translation memory (see translation_memory.py)
+TRANSLATION_MEMORY = os.environ.get("TRANSLATION_MEMORY", "1") == "1"
+translation_memory = TranslationMemory(path=os.environ.get("TRANSLATION_MEMORY_PATH", TRANSLATION_MEMORY_PATH),
+                                       max_entries=int(os.environ.get("TRANSLATION_MEMORY_SIZE", "20000")),
+                                       fuzzy=os.environ.get("TRANSLATION_MEMORY_FUZZY", "1") == "1")
 
-    if not from_lang or not to_lang:
-        return f"Error: Argos translation not available from {source_lang_code} to {target_lang_code}."
+# Each pipeline hands all sentences it has waiting to one batched call (see pipeline.py and reply_path.py). The two
+# mics translate opposite directions, so by default nothing waits for other callers (TRANSLATION_BATCH_WINDOW_MS=0);
+# requests for the same pair that queue up while a batch runs still share the next one (translation_batcher.py)
+TRANSLATION_BATCH_WINDOW_MS = float(os.environ.get("TRANSLATION_BATCH_WINDOW_MS", "0"))
+TRANSLATION_MAX_BATCH = int(os.environ.get("TRANSLATION_MAX_BATCH", "16"))
 
-    translation = from_lang.get_translation(to_lang)
-    return translation.translate(text)
+def load_translation():
+    if TRANSLATION_MEMORY:
+        translation_memory.load()
+    translation_engine.preload()
 
 class AudioRecorder:
-    def __init__(self, sample_rate=48000, channels=1, chunk=1024, folder_name=None, mic_name=None):
+    def __init__(self, sample_rate=48000, channels=1, chunk=1024, folder_name=None, mic_name=None,
+                 always_on=False, preroll_seconds=0.5):
         self.sample_rate = sample_rate
         self.channels = channels
         self.chunk = chunk
-        self.audio = pyaudio.PyAudio()
-        self.stream = None
-        self.frames = []
-        self.is_recording = False
-        self.device_index = self.get_input_device_index(mic_name)
-        self.device_name = self.get_device_name(self.device_index)
+        engine_class = simulation.FileCaptureEngine if SIMULATION else CaptureEngine
+        self.engine = engine_class(mic_name=mic_name, sample_rate=sample_rate, channels=channels, chunk=chunk,
+                                   always_on=always_on, preroll_seconds=preroll_seconds)
+        self.engine.open()  # opened once, button presses only start/stop the stream (or mark the ring when always-on)
+        self.device_index = self.engine.device_index
+        self.device_name = self.engine.device_name
         self.folder_name = folder_name or ("guest_mic_recordings" if "SF-558" in mic_name else "user_mic_recordings") #Button1's mic
         self.output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", self.folder_name)
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def get_input_device_index(self, target_name=None):
-        for i in range(self.audio.get_device_count()):
-            info = self.audio.get_device_info_by_index(i)
-            if info.get("maxInputChannels", 0) > 0:
-                if target_name is None or target_name.lower() in info["name"].lower():
-                    return i
-        raise ValueError(f"No input device found matching name: {target_name}")
-
-    def get_device_name(self, index):
-        return self.audio.get_device_info_by_index(index)["name"].replace(" ", "_")
+    @property
+    def is_recording(self):
+        return self.engine.capturing
 
     def start_recording(self):
         if self.is_recording:
             return
-        self.frames = []
-        self.stream = self.audio.open(format=pyaudio.paInt16,
-                                      channels=self.channels,
-                                      rate=self.sample_rate,
-                                      input=True,
-                                      input_device_index=self.device_index,
-                                      frames_per_buffer=self.chunk)
-        self.is_recording = True
+        self.engine.start()
 
     def stop_recording(self):
         if not self.is_recording:
             return
-        self.stream.stop_stream()
-        self.stream.close()
-        self.is_recording = False
+        self.last_pcm = self.engine.stop()
+
+    def get_audio(self):
+        # last recording as 16 kHz float32 for whisper, straight from memory
+        return self.to_whisper(getattr(self, "last_pcm", b""))
+
+    def to_whisper(self, pcm):
+        if not pcm:
+            return None
+        return pcm16_to_whisper(pcm, self.sample_rate, self.channels)
+
+    def get_duration(self):
+        return len(getattr(self, "last_pcm", b"")) / (2 * self.channels * self.sample_rate)
+
+    def archive_last_recording(self):
+        # optional: keep a copy of the recording, written in the background
+        pcm = getattr(self, "last_pcm", b"")
+        if not pcm:
+            return None
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         filename = f"{self.device_name}_{timestamp}.wav"
         filepath = os.path.join(self.output_dir, filename)
-        with wave.open(filepath, 'wb') as wf:
-            wf.setnchannels(self.channels)
-            wf.setsampwidth(self.audio.get_sample_size(pyaudio.paInt16))
-            wf.setframerate(self.sample_rate)
-            wf.writeframes(b''.join(self.frames))
+        write_wav_async(filepath, pcm, self.sample_rate, self.channels)
         self.last_filepath = filepath
-
-    def record_chunk(self):
-        if self.is_recording:
-            try:
-                data = self.stream.read(self.chunk, exception_on_overflow=False)
-                self.frames.append(data)
-            except Exception as e:
-                print(f"Audio read error: {e}")
+        return filepath
 
     def close(self):
-        if self.stream:
-            self.stream.close()
-        self.audio.terminate()
+        self.engine.close()
 
     def get_last_filepath(self):
         return getattr(self, "last_filepath", None)
 
-guest_recorder = AudioRecorder(mic_name="SF-558")
-user_recorder = AudioRecorder(mic_name="EPOS PC 7 USB")
+ARCHIVE_RECORDINGS = os.environ.get("ARCHIVE_RECORDINGS", "1") == "1"  # keep a WAV copy of every accepted recording in *_mic_recordings/
 
-guest_thread = None
-user_thread = None
-stop_guest = False
-stop_user = False
+# Keep both mics streaming all the time, a press then also gets the audio from just before it
+ALWAYS_ON_CAPTURE = os.environ.get("ALWAYS_ON_CAPTURE", "1") == "1"
+PREROLL_SECONDS = float(os.environ.get("PREROLL_SECONDS", "0.5"))
 
-def get_latest_recording(folder_name):
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    folder = os.path.join(base_dir, "..", folder_name)
-    files = glob.glob(os.path.join(folder, "*.wav"))
-    if not files:
-        return None
-    return max(files, key=os.path.getmtime)
+with startup.stage("mics"):
+    guest_recorder = AudioRecorder(mic_name="SF-558", always_on=ALWAYS_ON_CAPTURE, preroll_seconds=PREROLL_SECONDS)
+    user_recorder = AudioRecorder(mic_name="EPOS PC 7 USB", always_on=ALWAYS_ON_CAPTURE, preroll_seconds=PREROLL_SECONDS)
 
-def record_loop(recorder, stop_flag_name):
-    while not globals()[stop_flag_name]:
-        recorder.record_chunk()
-        time.sleep(0.01)
+# Shared model calls are handed out fairly between the two channels, only the same speaker is locked
+INFERENCE_SLOTS = int(os.environ.get("INFERENCE_SLOTS", "1"))
+scheduler = FairScheduler(slots=INFERENCE_SLOTS)
 
-def speak_with_piper(text, lang_code, device):
-    piper_models = {
-        "zh": {
-            "model": "zh_CN-huayan-medium.onnx",
-            "config": "zh_CN-huayan-medium.onnx.json"
-        },
-        "en": {
-            "model": "en_US-john-medium.onnx",
-            "config": "en_US-john-medium.onnx.json"
-        },
-        "de": {
-            "model": "de_DE-thorsten-medium.onnx",
-            "config": "de_DE-thorsten-medium.onnx.json"
-        }
-    }
-
-    PIPER_PATH = "/home/tollmatcher2/offline_translator/piper_rebuild/piper/piper"
-    OUTPUT_DIR = "/home/tollmatcher2/offline_translator/output"
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Streaming TTS: piper's raw PCM goes to the speaker while the sentence is still being synthesized
+STREAMING_TTS = os.environ.get("STREAMING_TTS", "1") == "1"
+TTS_JITTER_SECONDS = 0.15  # buffered before a streamed reply starts, covers piper's pauses between phrases
+piper_pool = PiperWorkerPool(streaming=STREAMING_TTS)  # one resident piper process per language, see piper_workers.py
+SAVE_TTS_OUTPUT = os.environ.get("SAVE_TTS_OUTPUT", "0") == "1"  # also keep every reply as a WAV in output/
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "output")
 
-    voice = piper_models[lang_code]
-    timestamp = int(time.time())
-    output_file = os.path.join(OUTPUT_DIR, f"{lang_code}_{timestamp}.wav")
+def save_tts_output(pcm, sample_rate, lang_code):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    output_file = os.path.join(OUTPUT_DIR, f"{lang_code}_{int(time.time())}.wav")
+    with wave.open(output_file, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    print(f"Synthesized speech saved to: {output_file}")
 
-    command = [
-        PIPER_PATH,
-        "--model", f"/home/tollmatcher2/offline_translator/piper_rebuild/piper/{voice['model']}",
-        "--config", f"/home/tollmatcher2/offline_translator/piper_rebuild/piper/{voice['config']}",
-        "--output_file", output_file,
-    ]
+# Replies that were synthesized before come from the cache (memory, then disk), see tts_cache.py
+TTS_CACHE = os.environ.get("TTS_CACHE", "1") == "1"
+tts_cache = TTSCache(folder=os.environ.get("TTS_CACHE_DIR", TTS_CACHE_DIR),
+                     memory_bytes=int(os.environ.get("TTS_CACHE_MEMORY_MB", "32")) * 1024 * 1024,
+                     disk_bytes=int(os.environ.get("TTS_CACHE_DISK_MB", "512")) * 1024 * 1024)
+
+def save_tts_output_async(pcm, sample_rate, lang_code):
+    threading.Thread(target=save_tts_output, args=(pcm, sample_rate, lang_code), daemon=True).start()
+
+# Translation memory -> batched Argos, TTS cache -> piper; benchmark.py replays recordings through the same path
+reply_path = ReplyPath(translation_engine, piper_pool, residency, scheduler=scheduler,
+                       translation_memory=translation_memory if TRANSLATION_MEMORY else None,
+                       tts_cache=tts_cache if TTS_CACHE else None,
+                       batch_window_seconds=TRANSLATION_BATCH_WINDOW_MS / 1000.0, max_batch=TRANSLATION_MAX_BATCH,
+                       on_synthesized=save_tts_output_async if SAVE_TTS_OUTPUT else None)
+synthesize_speech = reply_path.synthesize_speech
+
+def scheduled_synthesis(channel):
+    if not STREAMING_TTS:
+        return scheduler.wrap(channel, synthesize_speech)
+
+    # piper only works while the chunks are read, so that is when the fair slot is held
+    def synthesize(text, lang_code):
+        chunks, sample_rate = synthesize_speech(text, lang_code)
+        if isinstance(chunks, (bytes, bytearray)):
+            return chunks, sample_rate  # cache hit, nothing to synthesize
+
+        def scheduled_chunks():
+            with scheduler.slot(channel):
+                yield from chunks
+        return scheduled_chunks(), sample_rate
+    return synthesize
+
+def play_pcm(pcm, sample_rate, device):
+    # Queue the raw PCM on the open speaker stream, replies on the same speaker play one after another
+    speaker = output_engine.get(device)
+    if isinstance(pcm, (bytes, bytearray)):
+        clip = speaker.play(pcm, sample_rate)
+    else:
+        clip = speaker.play_stream(pcm, sample_rate, jitter_seconds=TTS_JITTER_SECONDS)
+    clip.wait()
 
+def speak_with_piper(text, lang_code, device):
     print("Synthesizing speech with Piper...")
-    process = subprocess.Popen(command, stdin=subprocess.PIPE)
-    process.communicate(input=text.encode("utf-8"))
-    print(f"Synthesized speech saved to: {output_file}")
-
-    # Play using the specified speaker device
-    subprocess.run(["aplay", "-D", device, output_file])
+    pcm, sample_rate = synthesize_speech(text, lang_code)
+    play_pcm(pcm, sample_rate, device)
+
+# Every recognized sentence is translated, synthesized and played as soon as it is ready (see pipeline.py)
+guest_pipeline = None
+user_pipeline = None
+
+def start_pipeline(source, target, device, channel):
+    # model calls wait for a fair CPU slot (translation per batch, see reply_path.py), playback only waits for its own speaker
+    return SentencePipeline(source, target, device,
+                            reply_path.translate_sentences,
+                            scheduled_synthesis(channel),
+                            play_pcm)
+
+def print_pipeline_times(pipeline, t0):
+    print(f"[Time] Translation took {pipeline.stage_times['translation']:.2f} seconds")
+    print(f"[Time] TTS took {pipeline.stage_times['tts']:.2f} seconds")
+    if pipeline.first_audio:
+        print(f"[Time] First audio after {pipeline.first_audio - t0:.2f} seconds")
+
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9105"))  # Prometheus text on http://127.0.0.1:9105/metrics
+
+def record_utterance_metrics(channel, source, target, capture_seconds, stt_seconds, pipeline, released_at, t_end):
+    labels = {"channel": channel, "pair": f"{source}_{target}"}
+    stage_latency.observe(capture_seconds, stage="capture", **labels)
+    stage_latency.observe(stt_seconds, stage="stt", **labels)
+    stage_latency.observe(pipeline.stage_times["translation"], stage="translation", **labels)
+    stage_latency.observe(pipeline.stage_times["tts"], stage="tts", **labels)
+    if pipeline.first_audio:
+        stage_latency.observe(pipeline.first_audio - released_at, stage="playback_start", **labels)
+    stage_latency.observe(t_end - released_at, stage="end_to_end", **labels)
+
+STREAMING_STT = os.environ.get("STREAMING_STT", "1") == "1"  # transcribe segments while the button is still held (see streaming_stt.py)
+guest_stream = None
+user_stream = None
+
+def start_streaming_stt(recorder, language, channel, pipeline):
+    label = channel.capitalize()
+
+    def on_final(text):
+        print(f"[{label} segment] {text}")
+        pipeline.submit(text)  # translation starts before the button is released
+
+    model = ScheduledModel(stt_registry.get(WHISPER_MODEL_SIZE), scheduler, channel)
+    stream = StreamingTranscriber(recorder.engine, model, language,
+                                  on_partial=lambda text: print(f"[{label} partial] {text}"),
+                                  on_final=on_final)
+    stream.start()
+    return stream
+
+def transcribe_recording(recorder, pcm, end_pos, stream, language, pipeline, channel):
+    # pcm and end_pos were taken on release, the recorder may already hold a later recording
+    if stream:
+        # most segments are already decoded (and submitted), only the tail after the last pause is left
+        return stream.finish(end_pos)
+    model = stt_registry.get(WHISPER_MODEL_SIZE)
+    with scheduler.slot(channel):
+        result = model.transcribe(recorder.to_whisper(pcm), language=language)
+    recognized = result["text"].strip()
+    pipeline.submit(recognized)
+    return recognized
+
+# Both channels can record and be processed at the same time, see channel_scheduler.py
+guest_worker = ChannelWorker("guest")
+user_worker = ChannelWorker("user")
+guest_langs = None  # (source, target) fixed at press time
+user_langs = None
+
+def process_utterance(channel, recorder, pcm, end_pos, stream, pipeline, source, target, duration, released_at):
+    # released_at is the button release: end-to-end and playback start include waiting behind earlier utterances
+    label = channel.capitalize()
+    try:
+        if not startup.ready.is_set():
+            print(f"[{label}] Models are still loading, the recording is processed once they are ready")
+            startup.ready.wait()
+        t0 = time.time()
+        print(f"[{label}] Transcribing ({source})...")
+        recognized = transcribe_recording(recorder, pcm, end_pos, stream, source, pipeline, channel)
+        t1 = time.time()
+        print(f"[{label}] Recognized text:", recognized)
+        print(f"[Time] STT took {t1 - t0:.2f} seconds")
+
+        print(f"[{label}] Translating to {target} and speaking with Piper...")
+        translation = pipeline.wait()  # sentences already in flight keep overlapping with playback
+        t3 = time.time()
+        print(f"[{label}] Translated text:", translation)
+        if t0 - released_at >= 0.1:
+            print(f"[Time] Waited {t0 - released_at:.2f} seconds before processing")
+        print_pipeline_times(pipeline, released_at)
+        print(f"[Total Time] {t3 - released_at:.2f} seconds")
+        record_utterance_metrics(channel, source, target, duration, t1 - t0, pipeline, released_at, t3)
+
+    except Exception as e:
+        print(f"Error in transcription, translation, or TTS: {e}")
+    finally:
+        pipeline.cancel()  # no-op after wait(), drops queued sentences after an error
 
 # Button 1 Logic (Guest)
 def button1_pressed():
-    global system_locked_by  
-    if system_locked_by and system_locked_by != "button1":
-        print(f"System is locked by {system_locked_by}. Button1 cannot operate.")
-        return
-
-    system_locked_by = "button1"  
     interrupt_audio_playback("button1")
 
-    global guest_thread, stop_guest, guest_button_confirmed, guest_record_start_time
+    global guest_button_confirmed, guest_record_start_time, guest_stream, guest_pipeline, guest_langs
 
-    if current_audio_owner in ["button3", "button4"]:
+    if current_audio_owner() in ["button3", "button4"]:
         print("Playback from Button3/4 is active. Button1 recording blocked.")
         return
 
@@ -323,84 +451,57 @@ def button1_pressed():
     print("Button1 pressed — start recording immediately")
     guest_button_confirmed = False
     guest_record_start_time = time.time()
+    guest_langs = (selected_langs['source'], selected_langs['target'])
 
     guest_recorder.start_recording()
-    stop_guest = False
-    guest_thread = threading.Thread(target=record_loop, args=(guest_recorder, 'stop_guest'))
-    guest_thread.start()
+    guest_pipeline = start_pipeline(guest_langs[0], guest_langs[1], GUEST_SPEAKER, "guest")
+    if STREAMING_STT and startup.ready.is_set():
+        guest_stream = start_streaming_stt(guest_recorder, guest_langs[0], "guest", guest_pipeline)
 
 
 
 
 def button1_released():
-    global guest_thread, stop_guest, guest_button_confirmed, guest_record_start_time
-    global system_locked_by
+    global guest_button_confirmed, guest_record_start_time, guest_stream, guest_pipeline
     if not guest_recorder.is_recording:
         return
 
-    duration = time.time() - guest_record_start_time
-    stop_guest = True
-    guest_thread.join()
+    released_at = time.time()
+    duration = released_at - guest_record_start_time
     guest_recorder.stop_recording()
-    
-    latest_file = get_latest_recording("guest_mic_recordings")
-    if duration < 1.0:  # Have to hold button1 more than 1s
-        print("Button1 released too early — delete latest recording")
-        if latest_file and os.path.exists(latest_file):
-            os.remove(latest_file)
-        system_locked_by = None
+    stream, guest_stream = guest_stream, None
+    pipeline, guest_pipeline = guest_pipeline, None
+
+    if duration < 1.0 or guest_recorder.get_duration() == 0:  # Have to hold button1 more than 1s
+        print("Button1 released too early — discard recording")
+        if stream:
+            stream.cancel()
+        pipeline.cancel()
         return
 
     print("Button1 released after 1s — continue with STT + translation + TTS")
+    if ARCHIVE_RECORDINGS:
+        guest_recorder.archive_last_recording()
+    print(f"Guest recording: {guest_recorder.get_duration():.2f} seconds")
 
-    latest_file = get_latest_recording("guest_mic_recordings")
-    if latest_file:
-        print(f"Latest guest recording: {latest_file}")
-        try:
-            source = selected_langs['source']
-            target = selected_langs['target']
-
-            t0 = time.time()
-            print(f"Transcribing ({source})...")
-            model = whisper.load_model("tiny", device="cpu")
-            result = model.transcribe(latest_file, language=source)
-            recognized = result["text"].strip()
-            t1 = time.time()
-            print("Recognized text:", recognized)
-            print(f"[Time] STT took {t1 - t0:.2f} seconds")
-
-            print(f"Translating to {target}...")
-            translation = translate_text(source, target, recognized)
-            t2 = time.time()
-            print("Translated text:", translation)
-            print(f"[Time] Translation took {t2 - t1:.2f} seconds")
-
-            print("Speaking with Piper...")
-            speak_with_piper(translation, target, device="plughw:CARD=USB,DEV=0")
-            t3 = time.time()
-            print(f"[Time] TTS took {t3 - t2:.2f} seconds")
-            print(f"[Total Time] {t3 - t0:.2f} seconds")
-
-        except Exception as e:
-            print(f"Error in transcription, translation, or TTS: {e}")
-        finally:
-            system_locked_by = None
-            print("System lock released from button1")
+    # processing runs in the guest worker, button2 can start recording right away; the recording is taken now,
+    # a later press may replace it before the worker gets to this one
+    pcm, end_pos = guest_recorder.last_pcm, guest_recorder.engine.capture_end
+    if stream:
+        stream.stop_at(end_pos, pcm)
+    source, target = guest_langs
+    guest_worker.submit(process_utterance, "guest", guest_recorder, pcm, end_pos, stream, pipeline, source, target, duration,
+                        released_at)
 
 
 
 # Button 2 Logic (User)
 def button2_pressed():
-    global system_locked_by
-    if system_locked_by and system_locked_by != "button2":
-        print(f"System is locked by {system_locked_by}. Button2 cannot operate.")
-        return
-    system_locked_by = "button2" 
     interrupt_audio_playback("button2")
 
-    global user_thread, stop_user, user_button_confirmed, user_record_start_time
+    global user_button_confirmed, user_record_start_time, user_stream, user_pipeline, user_langs
 
-    if current_audio_owner in ["button3", "button4"]:
+    if current_audio_owner() in ["button3", "button4"]:
         print("Playback from Button3/4 is active. Button2 recording blocked.")
         return
 
@@ -417,74 +518,55 @@ def button2_pressed():
     print("Button2 pressed — start recording immediately")
     user_button_confirmed = False
     user_record_start_time = time.time()
+    user_langs = (target, source)  # reverse
 
     user_recorder.start_recording()
-    stop_user = False
-    user_thread = threading.Thread(target=record_loop, args=(user_recorder, 'stop_user'))
-    user_thread.start()
+    user_pipeline = start_pipeline(user_langs[0], user_langs[1], USER_SPEAKER, "user")
+    if STREAMING_STT and startup.ready.is_set():
+        user_stream = start_streaming_stt(user_recorder, user_langs[0], "user", user_pipeline)
 
 
 
 
 # button2s target language and source language are opposite with button1's
 def button2_released():
-    global user_thread, stop_user, user_button_confirmed, user_record_start_time
-    global system_locked_by 
-    
+    global user_button_confirmed, user_record_start_time, user_stream, user_pipeline
+
     if not user_recorder.is_recording:
         return
 
-    duration = time.time() - user_record_start_time
-    stop_user = True
-    user_thread.join()
+    released_at = time.time()
+    duration = released_at - user_record_start_time
     user_recorder.stop_recording()
-
-    latest_file = get_latest_recording("user_mic_recordings")
-    if duration < 1.0: # Have to hold button2 more than 1s
-        print("Button2 released too early — delete latest recording")
-        if latest_file and os.path.exists(latest_file):
-            os.remove(latest_file)
-        system_locked_by = None
+    stream, user_stream = user_stream, None
+    pipeline, user_pipeline = user_pipeline, None
+
+    if duration < 1.0 or user_recorder.get_duration() == 0: # Have to hold button2 more than 1s
+        print("Button2 released too early — discard recording")
+        if stream:
+            stream.cancel()
+        pipeline.cancel()
         return
-        
+
     print("Button2 released after 1s — continue with STT + translation + TTS")
+    if ARCHIVE_RECORDINGS:
+        user_recorder.archive_last_recording()
+    print(f"User recording: {user_recorder.get_duration():.2f} seconds")
+
+    pcm, end_pos = user_recorder.last_pcm, user_recorder.engine.capture_end
+    if stream:
+        stream.stop_at(end_pos, pcm)
+    source, target = user_langs
+    user_worker.submit(process_utterance, "user", user_recorder, pcm, end_pos, stream, pipeline, source, target, duration,
+                       released_at)
 
-    latest_file = get_latest_recording("user_mic_recordings")
-    if latest_file:
-        print(f"Latest user recording: {latest_file}")
-        try:
-            # reverse
-            source = selected_langs['target']
-            target = selected_langs['source']
-
-            t0 = time.time()
-            print(f"Transcribing ({source})...")
-            model = whisper.load_model("tiny", device="cpu")
-            result = model.transcribe(latest_file, language=source)
-            recognized = result["text"].strip()
-            t1 = time.time()
-            print("Recognized text:", recognized)
-            print(f"[Time] STT took {t1 - t0:.2f} seconds")
-
-            print(f"Translating to {target}...")
-            translation = translate_text(source, target, recognized)
-            t2 = time.time()
-            print("Translated text:", translation)
-            print(f"[Time] Translation took {t2 - t1:.2f} seconds")
-
-            print("Speaking with Piper...")
-            speak_with_piper(translation, target, device="plughw:CARD=Device,DEV=0")
-            t3 = time.time()
-            print(f"[Time] TTS took {t3 - t2:.2f} seconds")
-            print(f"[Total Time] {t3 - t0:.2f} seconds")
-
-        except Exception as e:
-            print(f"Error in transcription, translation, or TTS: {e}")
-        finally:
-            system_locked_by = None
-            print("System lock released from button2")
-
-# gpiozero button binding
+try:
+    start_metrics_server(METRICS_PORT)
+except OSError as e:
+    print(f"[Metrics] Could not start metrics endpoint on port {METRICS_PORT}: {e}")
+
+# gpiozero button binding, before the models: language selection works right away and
+# recordings made while loading wait in their channel worker
 button1.when_pressed = button1_pressed
 button1.when_released = button1_released
 button2.when_pressed = button2_pressed
@@ -492,11 +574,69 @@ button2.when_released = button2_released
 button3.when_pressed = select_source
 button4.when_pressed = select_target
 
+def load_tts():
+    if TTS_CACHE:
+        tts_cache.load_index()
+    piper_pool.start()
+    piper_pool.warmup()
+
+# Load whisper, the Argos pairs and the Piper voices in parallel, each warmed up with one dummy inference,
+# then tell systemd we are ready
+startup.background("stt", stt_registry.preload, [WHISPER_MODEL_SIZE], True)
+startup.background("translation", load_translation)
+startup.background("tts", load_tts)
+startup.wait()
+
+def register_models():
+    size = WHISPER_MODEL_SIZE
+    pin_selected_models()
+    residency.register(f"stt:{size}", lambda: stt_registry.get(size), lambda: None,
+                       lambda: stt_registry.load_rss.get(size, 0.0), pinned=True)  # every press needs whisper
+    for name, step in translation_engine.model_steps().items():
+        residency.register(name, functools.partial(translation_engine.load_step, step),
+                           functools.partial(translation_engine.unload_step, step),
+                           functools.partial(translation_engine.step_size_mb, step))
+    for lang_code in piper_pool.workers:
+        residency.register(f"piper:{lang_code}", functools.partial(piper_pool.unpark, lang_code),
+                           functools.partial(piper_pool.park, lang_code),
+                           functools.partial(piper_pool.worker_rss_mb, lang_code))
+    residency.report()
+
+register_models()
+
+def run_scenario(path):
+    # press/hold/release the mock buttons on the scripted timeline, then wait for both channels to finish
+    driver = simulation.ScenarioDriver({"button1": button1, "button2": button2, "button3": button3, "button4": button4},
+                                       {"button1": guest_recorder.engine, "button2": user_recorder.engine})
+    t_start = time.time()
+    driver.run(path)
+    while guest_worker.pending() or user_worker.pending():
+        time.sleep(0.1)
+    print(f"[Simulation] Scenario finished after {time.time() - t_start:.2f} seconds")
+    for stage in ("stt", "translation", "tts", "playback_start", "end_to_end"):
+        for channel in ("guest", "user"):
+            for pair in (f"{a}_{b}" for a in language_codes for b in language_codes if a != b):
+                q = stage_latency.quantiles((0.5, 0.95), stage=stage, channel=channel, pair=pair)
+                if q[0.5] is not None:
+                    print(f"[Simulation] {stage} {channel} {pair}: p50 {q[0.5]:.2f}s, p95 {q[0.95]:.2f}s")
+
 try:
-    print("Waiting for button presses...")
-    while True:
-        time.sleep(1)
+    if SIMULATION and SIMULATION_SCENARIO:
+        run_scenario(SIMULATION_SCENARIO)
+    else:
+        print("Waiting for button presses...")
+        while True:
+            time.sleep(1)
 except KeyboardInterrupt:
+    pass
+finally:
     guest_recorder.close()
     user_recorder.close()
+    piper_pool.stop()
+    reply_path.close()
+    tts_cache.report()
+    translation_memory.report()
+    translation_memory.close()
+    residency.report()
+    output_engine.close()
     print("Cleaned up and exited.")
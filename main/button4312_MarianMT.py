@@ -10,12 +10,14 @@ import glob
 import subprocess
 import pyaudio
 import wave
-import whisper
+from stt_models import stt_registry
 import warnings
-from transformers import MarianMTModel, MarianTokenizer
+from marian_engine import create_marian_engine
 
 warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
 
+WHISPER_MODEL_SIZE = "tiny"  # loaded once at start, shared by both mics
+
 # Button pin definitions
 BUTTON1_PIN = 27  # button1 - guest mic
 BUTTON2_PIN = 22  # button2 - user mic
@@ -97,15 +99,11 @@ def select_source():
 
 
 
+translation_engine = create_marian_engine(language_codes) # opus-mt models stay loaded, pairs without one go through English (MARIAN_BACKEND=ctranslate2 for the int8 models)
+
 def translate_text(source_lang_code, target_lang_code, text):
-    model_name = f"Helsinki-NLP/opus-mt-{source_lang_code}-{target_lang_code}" # using MarienMT with small model to translate text
     try:
-        tokenizer = MarianTokenizer.from_pretrained(model_name)
-        model = MarianMTModel.from_pretrained(model_name)
-        inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True)
-        translated_tokens = model.generate(**inputs)
-        translation = tokenizer.decode(translated_tokens[0], skip_special_tokens=True)
-        return translation
+        return translation_engine.translate(source_lang_code, target_lang_code, text)
     except Exception as e:
         return f"Translation error: {e}"
 
@@ -274,7 +272,7 @@ def button1_released():
 
             t0 = time.time()
             print(f"Transcribing ({source})...")
-            model = whisper.load_model("tiny", device="cpu")
+            model = stt_registry.get(WHISPER_MODEL_SIZE)
             result = model.transcribe(latest_file, language=source)
             recognized = result["text"].strip()
             t1 = time.time()
@@ -330,7 +328,7 @@ def button2_released():
 
             t0 = time.time()
             print(f"Transcribing ({source})...")
-            model = whisper.load_model("tiny", device="cpu")
+            model = stt_registry.get(WHISPER_MODEL_SIZE)
             result = model.transcribe(latest_file, language=source)
             recognized = result["text"].strip()
             t1 = time.time()
@@ -352,6 +350,12 @@ def button2_released():
         except Exception as e:
             print(f"Error in transcription, translation, or TTS: {e}")
             
+# Load whisper once before accepting button presses
+stt_registry.preload([WHISPER_MODEL_SIZE])
+# and the MarianMT models of the default language pair, both directions (the other pairs load on first use)
+translation_engine.preload([(selected_langs['source'], selected_langs['target']),
+                            (selected_langs['target'], selected_langs['source'])])
+
 # gpiozero button binding
 button1.when_pressed = button1_pressed
 button1.when_released = button1_released
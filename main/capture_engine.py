@@ -0,0 +1,136 @@
+# Function: callback-driven microphone capture
+# PortAudio calls us with every block of audio and we copy it into a preallocated ring buffer,
+# so no thread has to poll stream.read() and nothing is lost while the handlers are busy.
+# The stream is opened once, button presses only start/stop it.
+# With always_on=True the stream never stops: the ring keeps the last few seconds all the time and a
+# button press starts the utterance preroll_seconds before the press, so the first syllable is not cut off.
+import threading
+import numpy as np
+import pyaudio
+
+
+class RingBuffer:
+    # fixed size int16 buffer, positions are counted in samples since the start and never wrap
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=np.int16)
+        self.total_written = 0
+        self.lock = threading.Lock()
+
+    def write(self, samples):
+        n = len(samples)
+        with self.lock:
+            if n >= self.capacity:
+                samples = samples[-self.capacity:]
+                self.total_written += n - self.capacity
+                n = self.capacity
+            start = self.total_written % self.capacity
+            first = min(n, self.capacity - start)
+            self.data[start:start + first] = samples[:first]
+            self.data[:n - first] = samples[first:]
+            self.total_written += n
+
+    def oldest_position(self):
+        return max(0, self.total_written - self.capacity)
+
+    def read(self, start, end=None):
+        # copy of the samples between two positions, clipped to what is still in the buffer
+        with self.lock:
+            end = self.total_written if end is None else min(end, self.total_written)
+            start = max(start, self.total_written - self.capacity, 0)
+            if end <= start:
+                return np.zeros(0, dtype=np.int16)
+            i = start % self.capacity
+            j = end % self.capacity
+            if i < j:
+                return self.data[i:j].copy()
+            return np.concatenate((self.data[i:], self.data[:j]))
+
+
+def find_input_device(audio, target_name=None):
+    for i in range(audio.get_device_count()):
+        info = audio.get_device_info_by_index(i)
+        if info.get("maxInputChannels", 0) > 0:
+            if target_name is None or target_name.lower() in info["name"].lower():
+                return i
+    raise ValueError(f"No input device found matching name: {target_name}")
+
+
+class CaptureEngine:
+    def __init__(self, mic_name=None, sample_rate=48000, channels=1, chunk=1024, max_seconds=60,
+                 always_on=False, preroll_seconds=0.5):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.chunk = chunk
+        self.audio = pyaudio.PyAudio()
+        self.device_index = find_input_device(self.audio, mic_name)
+        self.device_name = self.audio.get_device_info_by_index(self.device_index)["name"].replace(" ", "_")
+        self.always_on = always_on
+        self.preroll_samples = int(preroll_seconds * sample_rate) * channels
+        self.ring = RingBuffer(int((max_seconds + preroll_seconds) * sample_rate) * channels)
+        self.stream = None
+        self.capturing = False
+        self.capture_start = 0
+        self.capture_end = 0
+        self.overflows = 0       # blocks PortAudio reported as overflowed (audio lost in the driver)
+        self.dropped_frames = 0  # frames overwritten in the ring before we read them (utterance too long)
+
+    def open(self):
+        if self.stream is not None:
+            return
+        self.stream = self.audio.open(format=pyaudio.paInt16,
+                                      channels=self.channels,
+                                      rate=self.sample_rate,
+                                      input=True,
+                                      input_device_index=self.device_index,
+                                      frames_per_buffer=self.chunk,
+                                      stream_callback=self.callback,
+                                      start=False)
+        if self.always_on:
+            self.stream.start_stream()
+            print(f"[Capture] {self.device_name}: always-on with {self.preroll_samples // self.channels / self.sample_rate:.2f} seconds pre-roll")
+
+    def callback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paInputOverflow:
+            self.overflows += 1
+        if self.capturing or self.always_on:
+            self.ring.write(np.frombuffer(in_data, dtype=np.int16))
+        return (None, pyaudio.paContinue)
+
+    def start(self):
+        if self.capturing:
+            return
+        self.open()
+        if self.always_on:
+            # take the pre-roll that is already in the ring
+            self.capture_start = max(self.ring.total_written - self.preroll_samples, self.ring.oldest_position())
+        else:
+            self.capture_start = self.ring.total_written
+        self.capturing = True
+        if not self.stream.is_active():
+            self.stream.start_stream()
+
+    def stop(self):
+        # returns the captured utterance as int16 PCM bytes
+        if not self.capturing:
+            return b""
+        if self.always_on:
+            capture_end = self.ring.total_written
+        else:
+            self.stream.stop_stream()  # waits for the last callback, the device stays open
+            capture_end = self.ring.total_written
+        self.capturing = False
+        self.capture_end = capture_end
+        lost = self.ring.oldest_position() - self.capture_start
+        if lost > 0:
+            self.dropped_frames += lost // self.channels
+            print(f"[Capture] {self.device_name}: {lost // self.channels} frames dropped (recording longer than buffer)")
+        return self.ring.read(self.capture_start, capture_end).tobytes()
+
+    def close(self):
+        self.capturing = False
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        self.audio.terminate()
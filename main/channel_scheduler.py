@@ -0,0 +1,88 @@
+# Function: let the guest and the user channel work at the same time
+# Instead of one lock for the whole device:
+#   ChannelWorker   every channel processes its own utterances in order, in its own thread
+#   FairScheduler   model calls (STT, translation, TTS) of both channels share a few CPU slots,
+#                   handed out round-robin so a long guest explanation cannot starve the user
+# The models themselves are shared, nothing is loaded twice.
+import collections
+import queue
+import threading
+from contextlib import contextmanager
+
+
+class FairScheduler:
+    def __init__(self, slots=1):
+        self.slots = slots  # how many model calls may run at once (the Pi has 4 cores, each model uses several)
+        self.in_use = 0
+        self.waiting = collections.OrderedDict()  # channel -> deque of Events, in round-robin order
+        self.lock = threading.Lock()
+
+    def acquire(self, channel):
+        with self.lock:
+            if self.in_use < self.slots and not self.waiting:
+                self.in_use += 1
+                return
+            ready = threading.Event()
+            self.waiting.setdefault(channel, collections.deque()).append(ready)
+        ready.wait()  # the slot is handed over directly by release()
+
+    def release(self):
+        with self.lock:
+            if not self.waiting:
+                self.in_use -= 1
+                return
+            channel, waiters = next(iter(self.waiting.items()))
+            ready = waiters.popleft()
+            del self.waiting[channel]
+            if waiters:
+                self.waiting[channel] = waiters  # back to the end of the line, the other channel goes next
+            ready.set()
+
+    @contextmanager
+    def slot(self, channel):
+        self.acquire(channel)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def wrap(self, channel, func):
+        def scheduled(*args, **kwargs):
+            with self.slot(channel):
+                return func(*args, **kwargs)
+        return scheduled
+
+
+class ScheduledModel:
+    # STT model whose transcribe() waits for a fair slot first
+    def __init__(self, model, scheduler, channel):
+        self.model = model
+        self.transcribe = scheduler.wrap(channel, model.transcribe)
+
+
+class ChannelWorker:
+    def __init__(self, name):
+        self.name = name
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args):
+        self.jobs.put((func, args))
+        if self.jobs.unfinished_tasks > 1:
+            print(f"[Scheduler] {self.name}: utterance queued ({self.jobs.qsize()} waiting)")
+
+    def pending(self):
+        # queued plus running jobs, counted by the queue itself so a job that was just taken is never missed
+        return self.jobs.unfinished_tasks
+
+    def run(self):
+        while True:
+            func, args = self.jobs.get()
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"[Scheduler] {self.name}: job failed: {e}")
+            finally:
+                self.jobs.task_done()
+
@@ -6,13 +6,15 @@ import glob
 import subprocess
 import pyaudio
 import wave
-import whisper
+from stt_models import stt_registry
 import warnings
 import argostranslate.package
 import argostranslate.translate
 
 warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
 
+WHISPER_MODEL_SIZE = "tiny"  # loaded once at start, shared by both mics
+
 # GPIO buttons
 button1 = Button(27, pull_up=True, bounce_time=0.2)
 button2 = Button(22, pull_up=True, bounce_time=0.2)
@@ -306,7 +308,7 @@ def button1_released():
 
             t0 = time.time()
             print(f"Transcribing ({source})...")
-            model = whisper.load_model("tiny", device="cpu")
+            model = stt_registry.get(WHISPER_MODEL_SIZE)
             result = model.transcribe(latest_file, language=source)
             recognized = result["text"].strip()
             t1 = time.time()
@@ -363,7 +365,7 @@ def button2_released():
 
             t0 = time.time()
             print(f"Transcribing ({source})...")
-            model = whisper.load_model("tiny", device="cpu")
+            model = stt_registry.get(WHISPER_MODEL_SIZE)
             result = model.transcribe(latest_file, language=source)
             recognized = result["text"].strip()
             t1 = time.time()
@@ -439,6 +441,9 @@ def button4_pressed():
 def button4_released():
     release_button(button4)
 
+# Load whisper once before accepting button presses
+stt_registry.preload([WHISPER_MODEL_SIZE])
+
 # Bindings
 button1.when_pressed = button1_pressed
 button1.when_released = button1_released
@@ -0,0 +1,51 @@
+# Function: convert the opus-mt (MarianMT) models to CTranslate2 with int8 weights, run once per device
+# Writes models/opus-mt-{source}-{target}-ct2 with the model and its tokenizer, used by
+# MARIAN_BACKEND=ctranslate2 (see marian_engine.py). Directions without an opus-mt model are skipped,
+# the engine chains them through English.
+#
+# How to run (from main/, needs the Hugging Face models once, e.g. on a machine with internet):
+#   python3 convert_marian_ct2.py
+#   python3 convert_marian_ct2.py --languages en de --quantization int8_float32 --force
+import argparse
+import itertools
+import os
+import time
+from marian_engine import CT2_MODEL_DIR, MODEL_TEMPLATE
+
+
+def convert(source, target, output_root, quantization, force):
+    import ctranslate2
+    from transformers import MarianTokenizer
+    name = MODEL_TEMPLATE.format(source=source, target=target)
+    output_dir = os.path.join(output_root, f"opus-mt-{source}-{target}-ct2")
+    if os.path.isdir(output_dir) and not force:
+        print(f"{output_dir} exists, skipped (use --force to convert again)")
+        return True
+    t0 = time.time()
+    try:
+        tokenizer = MarianTokenizer.from_pretrained(name)
+        ctranslate2.converters.TransformersConverter(name).convert(output_dir, quantization=quantization, force=force)
+    except OSError as e:
+        print(f"No model for {source} -> {target}: {e}")
+        return False
+    tokenizer.save_pretrained(output_dir)  # the runtime does not need the PyTorch weights any more
+    print(f"{name} -> {output_dir} ({quantization}) in {time.time() - t0:.1f} seconds")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert opus-mt models to CTranslate2")
+    parser.add_argument("--languages", nargs="+", default=["en", "de", "zh"])
+    parser.add_argument("--output", default=CT2_MODEL_DIR)
+    parser.add_argument("--quantization", default="int8", help="int8, int8_float32, int16 or float32")
+    parser.add_argument("--force", action="store_true", help="overwrite models that were converted before")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    converted = [pair for pair in itertools.permutations(args.languages, 2)
+                 if convert(*pair, args.output, args.quantization, args.force)]
+    print(f"{len(converted)} directions available: {', '.join(f'{s}-{t}' for s, t in converted)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# Function: accuracy metrics for the benchmarks
+#   word_error_rate  STT quality against a reference transcript (characters for Chinese)
+#   corpus_bleu      translation quality against reference translations (BLEU-4, 0 - 100)
+import collections
+import math
+import re
+import editdistance
+
+
+def tokenize(text, language):
+    text = text.lower().strip()
+    if language == "zh":
+        return [c for c in text if not c.isspace() and not re.match(r"[\W_]", c)]  # Chinese is scored per character
+    return re.findall(r"\w+", text)
+
+
+def word_error_rate(reference, hypothesis, language="en"):
+    ref = tokenize(reference, language)
+    hyp = tokenize(hypothesis, language)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    return editdistance.eval(ref, hyp) / len(ref)
+
+
+def ngrams(tokens, n):
+    return collections.Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def corpus_bleu(references, hypotheses, language="en", max_n=4):
+    matches = [0] * max_n
+    totals = [0] * max_n
+    ref_len = 0
+    hyp_len = 0
+    for reference, hypothesis in zip(references, hypotheses):
+        ref = tokenize(reference, language)
+        hyp = tokenize(hypothesis, language)
+        ref_len += len(ref)
+        hyp_len += len(hyp)
+        for n in range(1, max_n + 1):
+            ref_counts = ngrams(ref, n)
+            hyp_counts = ngrams(hyp, n)
+            matches[n - 1] += sum(min(count, ref_counts[gram]) for gram, count in hyp_counts.items())
+            totals[n - 1] += max(0, len(hyp) - n + 1)
+    if hyp_len == 0 or min(matches) == 0:
+        return 0.0
+    log_precision = sum(math.log(m / t) for m, t in zip(matches, totals)) / max_n
+    brevity = 1.0 if hyp_len > ref_len else math.exp(1 - ref_len / hyp_len)
+    return 100.0 * brevity * math.exp(log_precision)
@@ -0,0 +1,183 @@
+# Function: MarianMT (Helsinki-NLP opus-mt) translation with resident models
+# Each direction's tokenizer and model are loaded from the Hugging Face cache once and kept in memory,
+# at most max_resident of them (least recently used is dropped). Directions without an opus-mt model are
+# chained through English. Two backends, same translate(source, target, text) contract:
+#   pytorch      transformers MarianMTModel, FP32, generate under torch.inference_mode
+#   ctranslate2  the same weights converted to CTranslate2 with int8 weights (convert_marian_ct2.py)
+# Long transcripts are split into sentences (segmentation.py) and translated as batches in one call,
+# shortest first so each batch pads to similar lengths, then put back in their original order.
+# With MARIAN_BATCH_WINDOW_MS > 0, sentences of concurrent callers translating the same pair within the window share
+# one batch (translation_batcher.py). Off by default, the MarianMT scripts translate one request at a time.
+#   MARIAN_BACKEND=ctranslate2  MARIAN_THREADS=4  MARIAN_MAX_RESIDENT=4  MARIAN_NUM_BEAMS=1  MARIAN_MAX_BATCH=16
+#   MARIAN_BATCH_WINDOW_MS=0  (e.g. 20 when several threads share one engine)
+import collections
+import gc
+import os
+import threading
+import time
+from memory_usage import get_rss_mb
+from segmentation import join_sentences, split_sentences
+from translation_batcher import TranslationBatcher
+
+MODEL_TEMPLATE = "Helsinki-NLP/opus-mt-{source}-{target}"
+CT2_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models")
+
+# multi-target opus-mt models need the target variant as the first token
+TARGET_PREFIX = {
+    ("en", "zh"): ">>cmn_Hans<< ",
+}
+
+
+class MarianTranslationEngine:
+    name = "pytorch"
+
+    def __init__(self, language_codes, pivot_lang="en", max_resident=None, num_threads=None, num_beams=None,
+                 max_batch=None, batch_window_ms=None, model_template=MODEL_TEMPLATE):
+        self.language_codes = list(language_codes)
+        self.pivot_lang = pivot_lang
+        self.max_resident = max_resident or int(os.environ.get("MARIAN_MAX_RESIDENT", "4"))
+        self.num_threads = num_threads or int(os.environ.get("MARIAN_THREADS", "0"))  # 0 = torch default
+        self.num_beams = num_beams or int(os.environ.get("MARIAN_NUM_BEAMS", "1"))  # greedy is much faster on a Pi
+        self.max_batch = max_batch or int(os.environ.get("MARIAN_MAX_BATCH", "16"))
+        if batch_window_ms is None:
+            batch_window_ms = float(os.environ.get("MARIAN_BATCH_WINDOW_MS", "0"))
+        self.batcher = None
+        if batch_window_ms > 0:
+            self.batcher = TranslationBatcher(self.translate_sentences, batch_window_ms / 1000.0, self.max_batch)
+        self.model_template = model_template
+        self.models = collections.OrderedDict()  # (source, target) -> (tokenizer, model), most recent last
+        self.missing = set()  # directions without an opus-mt model
+        self.load_lock = threading.Lock()
+        self.threads_set = False
+
+    def model_name(self, source, target):
+        return self.model_template.format(source=source, target=target)
+
+    def load(self, source, target):
+        pair = (source, target)
+        with self.load_lock:  # two channels asking for the same direction load it once
+            if pair in self.models:
+                self.models.move_to_end(pair)
+                return self.models[pair]
+            if pair in self.missing:
+                return None
+            name = self.model_name(source, target)
+            rss_before = get_rss_mb()
+            t0 = time.time()
+            try:
+                tokenizer, model = self.load_model(source, target)
+            except OSError as e:
+                print(f"[MarianMT] No model for {source} -> {target}: {e}")
+                self.missing.add(pair)
+                return None
+            self.models[pair] = (tokenizer, model)
+            print(f"[MarianMT] Loaded {name} in {time.time() - t0:.2f} seconds (+{get_rss_mb() - rss_before:.0f} MB RSS)")
+            while len(self.models) > self.max_resident:
+                (old_source, old_target), _ = self.models.popitem(last=False)
+                print(f"[MarianMT] Unloaded {old_source} -> {old_target}")
+                gc.collect()
+            return self.models[pair]
+
+    def load_model(self, source, target):
+        import torch
+        from transformers import MarianMTModel, MarianTokenizer  # heavy, only once a model is needed
+        if self.num_threads and not self.threads_set:
+            torch.set_num_threads(self.num_threads)
+            self.threads_set = True
+        name = self.model_name(source, target)
+        return MarianTokenizer.from_pretrained(name), MarianMTModel.from_pretrained(name).eval()
+
+    def route(self, source, target):
+        # the directions to run one after another, or None
+        if self.load(source, target):
+            return [(source, target)]
+        if self.pivot_lang in (source, target):
+            return None
+        if self.load(source, self.pivot_lang) and self.load(self.pivot_lang, target):
+            return [(source, self.pivot_lang), (self.pivot_lang, target)]
+        return None
+
+    def preload(self, pairs=None, warmup_text="Hello"):
+        t0 = time.time()
+        pairs = pairs or [(s, t) for s in self.language_codes for t in self.language_codes if s != t]
+        for source, target in pairs:
+            if warmup_text:
+                self.translate(source, target, warmup_text)
+            else:
+                self.route(source, target)
+        print(f"[MarianMT] {len(self.models)} models resident after {time.time() - t0:.2f} seconds")
+
+    def run_batch(self, source, target, sentences):
+        import torch
+        tokenizer, model = self.load(source, target)
+        prefix = TARGET_PREFIX.get((source, target), "")
+        with torch.inference_mode():
+            # sentences are short after segmentation, truncation only guards the 512 token limit
+            inputs = tokenizer([prefix + s for s in sentences], return_tensors="pt", padding=True, truncation=True)
+            tokens = model.generate(**inputs, num_beams=self.num_beams)
+        return tokenizer.batch_decode(tokens, skip_special_tokens=True)
+
+    def translate_sentences(self, source, target, sentences):
+        steps = self.route(source, target)
+        if not steps:
+            return None
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        translations = [None] * len(sentences)
+        for start in range(0, len(order), self.max_batch):
+            indices = order[start:start + self.max_batch]
+            batch = [sentences[i] for i in indices]
+            for step_source, step_target in steps:
+                batch = self.run_batch(step_source, step_target, batch)
+            for i, translation in zip(indices, batch):
+                translations[i] = translation
+        return translations
+
+    def translate(self, source, target, text):
+        sentences = split_sentences(text, source)
+        if not sentences:
+            return ""
+        if self.batcher:
+            translations = self.batcher.translate(source, target, sentences)
+        else:
+            translations = self.translate_sentences(source, target, sentences)
+        if translations is None:
+            return f"Translation error: no MarianMT model from {source} to {target}"
+        return join_sentences(translations, target)
+
+
+class MarianCT2TranslationEngine(MarianTranslationEngine):
+    name = "ctranslate2"
+
+    def __init__(self, language_codes, model_dir=CT2_MODEL_DIR, compute_type=None, **kw):
+        super().__init__(language_codes, **kw)
+        self.model_dir = model_dir
+        self.compute_type = compute_type or os.environ.get("MARIAN_COMPUTE_TYPE", "int8")
+
+    def model_name(self, source, target):
+        return os.path.join(self.model_dir, f"opus-mt-{source}-{target}-ct2")
+
+    def load_model(self, source, target):
+        import ctranslate2  # only needed on devices that use this backend
+        from transformers import MarianTokenizer  # the converter stores the tokenizer next to the model
+        path = self.model_name(source, target)
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"CTranslate2 model not found: {path} (run convert_marian_ct2.py)")
+        translator = ctranslate2.Translator(path, device="cpu", compute_type=self.compute_type,
+                                            intra_threads=self.num_threads, inter_threads=1)
+        return MarianTokenizer.from_pretrained(path), translator
+
+    def run_batch(self, source, target, sentences):
+        tokenizer, translator = self.load(source, target)
+        prefix = TARGET_PREFIX.get((source, target), "")
+        tokens = [tokenizer.convert_ids_to_tokens(tokenizer.encode(prefix + s, truncation=True)) for s in sentences]
+        results = translator.translate_batch(tokens, beam_size=self.num_beams)
+        return [tokenizer.decode(tokenizer.convert_tokens_to_ids(result.hypotheses[0]), skip_special_tokens=True)
+                for result in results]
+
+def create_marian_engine(language_codes, backend=None, **kw):
+    backend = backend or os.environ.get("MARIAN_BACKEND", "pytorch")
+    if backend == "pytorch":
+        return MarianTranslationEngine(language_codes, **kw)
+    if backend == "ctranslate2":
+        return MarianCT2TranslationEngine(language_codes, **kw)
+    raise ValueError(f"Unknown MarianMT backend: {backend} (use 'pytorch' or 'ctranslate2')")
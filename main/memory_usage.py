@@ -0,0 +1,24 @@
+# Function: read the resident memory (RSS) of this process, used to report how much RAM the loaded models take
+# Works on Linux / Raspberry Pi OS only (reads /proc), returns 0.0 elsewhere
+
+def get_rss_mb(pid="self"):
+    # pid of a child process (e.g. a piper worker) to measure that one instead
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0  # value is in kB
+    except OSError:
+        pass
+    return 0.0
+
+
+def get_peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
@@ -0,0 +1,125 @@
+# Function: keep the resident models inside a memory budget
+# Every model (whisper, each Argos CTranslate2 direction, each piper voice) is registered with a load and an
+# unload function and its size in MB. When a model is needed and the budget is exceeded, the least recently
+# used models that are not pinned and not in use are unloaded; they are loaded again on their next use.
+# The pair selected with button3/4 (both directions) is pinned, so the next press never waits for a reload.
+#   MODEL_MEMORY_BUDGET_MB=0 disables eviction, sizes and evictions are still reported on /metrics
+import threading
+import time
+from contextlib import contextmanager
+from memory_usage import get_rss_mb
+from metrics import metrics
+
+model_memory = metrics.gauge("translator_model_resident_mb", "Memory of each resident model, 0 when unloaded",
+                             labels=("model",))
+memory_totals = metrics.gauge("translator_model_memory_mb", "Model memory budget, resident total and process RSS",
+                              labels=("kind",))
+model_evictions = metrics.counter("translator_model_evictions_total", "Models unloaded to stay within the budget",
+                                  labels=("model",))
+model_loads = metrics.counter("translator_model_loads_total", "Models loaded again after an eviction",
+                              labels=("model",))
+
+
+class ResidentModel:
+    def __init__(self, name, load, unload, measure, loaded=True, pinned=False):
+        self.name = name
+        self.load = load        # load(), returns when the model is ready
+        self.unload = unload    # unload(), frees the memory
+        self.measure = measure  # measure() -> MB the loaded model takes
+        self.loaded = loaded
+        self.pinned = pinned    # always resident (e.g. whisper)
+        self.size_mb = measure() if loaded else 0.0
+        self.users = 0
+        self.last_used = time.time()
+
+
+class ModelResidency:
+    def __init__(self, budget_mb=0):
+        self.budget_mb = budget_mb
+        self.models = {}
+        self.pinned = set()  # names pinned by the current language selection
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()  # one load at a time, the Pi has no memory for two
+        memory_totals.set(budget_mb, kind="budget")
+
+    def register(self, name, load, unload, measure, loaded=True, pinned=False):
+        model = ResidentModel(name, load, unload, measure, loaded, pinned)
+        with self.lock:
+            self.models[name] = model
+        model_memory.set(model.size_mb, model=name)
+        self.make_room(0.0)
+
+    def pin(self, names):
+        with self.lock:
+            self.pinned = set(names)
+
+    @contextmanager
+    def use(self, *names):
+        # the models stay loaded while the block runs
+        models = [self.models[name] for name in names if name in self.models]
+        with self.lock:
+            for model in models:
+                model.users += 1
+                model.last_used = time.time()
+        try:
+            for model in models:
+                if not model.loaded:
+                    self.load(model)
+            yield
+        finally:
+            with self.lock:
+                for model in models:
+                    model.users -= 1
+
+    def load(self, model):
+        with self.load_lock:
+            if model.loaded:
+                return
+            self.make_room(model.size_mb)  # the size from its last load, if it was loaded before
+            t0 = time.time()
+            model.load()
+            model.size_mb = model.measure()
+            model.loaded = True
+            model_loads.inc(model=model.name)
+            model_memory.set(model.size_mb, model=model.name)
+            print(f"[Models] Loaded {model.name} again in {time.time() - t0:.2f} seconds ({model.size_mb:.0f} MB)")
+        self.make_room(0.0)
+
+    def resident_mb(self):
+        return sum(m.size_mb for m in self.models.values() if m.loaded)
+
+    def make_room(self, incoming_mb):
+        if not self.budget_mb:
+            self.update_totals()
+            return
+        with self.lock:
+            resident = self.resident_mb()
+            for model in sorted(self.models.values(), key=lambda m: m.last_used):
+                if resident + incoming_mb <= self.budget_mb:
+                    break
+                if not model.loaded or model.pinned or model.name in self.pinned or model.users:
+                    continue
+                model.unload()
+                model.loaded = False
+                resident -= model.size_mb
+                model_evictions.inc(model=model.name)
+                model_memory.set(0, model=model.name)
+                print(f"[Models] Unloaded {model.name} ({model.size_mb:.0f} MB, unused for "
+                      f"{time.time() - model.last_used:.0f} seconds)")
+            if resident + incoming_mb > self.budget_mb:
+                print(f"[Models] {resident + incoming_mb:.0f} MB needed, budget is {self.budget_mb:.0f} MB "
+                      f"(everything else is pinned or in use)")
+        self.update_totals()
+
+    def update_totals(self):
+        memory_totals.set(self.resident_mb(), kind="resident")
+        memory_totals.set(get_rss_mb(), kind="process")
+
+    def report(self):
+        self.update_totals()
+        print(f"[Models] {self.resident_mb():.0f} MB resident (budget {self.budget_mb or 'none'}), "
+              f"process RSS {get_rss_mb():.0f} MB")
+        for name, model in self.models.items():
+            state = "pinned" if model.pinned or name in self.pinned else ("loaded" if model.loaded else "unloaded")
+            print(f"[Models]   {name:<14} {model.size_mb:6.0f} MB  {state:<8} "
+                  f"evictions {model_evictions.get(model=name):.0f}")
@@ -0,0 +1,276 @@
+# Function: in-process speaker output, replaces one aplay process per prompt and per reply
+# Every speaker gets one PortAudio stream that is opened at start and never closed. A clip (int16 PCM) is
+# converted once to the speaker's native rate and channel count, queued, and the stream callback mixes:
+#   lane "prompt"   language prompts of button3/4, a new prompt replaces the one that is playing
+#   lane "reply"    translated speech, played one after another without gaps
+# stop() and interrupt() take effect at the next callback block (chunk frames), nothing after that is played.
+# Ownership lives with the clip: who started it and which buttons may interrupt it.
+# A StreamClip is filled while it plays (streaming TTS): it starts once jitter_seconds are buffered and
+# pauses the lane, not the whole speaker, if synthesis falls behind.
+import collections
+import os
+import re
+import threading
+import numpy as np
+import pyaudio
+from audio_utils import StreamResampler, pcm16_to_float32, resample
+
+LANES = ("prompt", "reply")
+
+
+def alsa_card(device):
+    # "plughw:CARD=USB,DEV=0" -> (1, 0), using the card number ALSA gave the "USB" card at boot
+    match = re.search(r"CARD=([^,]+)(?:,DEV=(\d+))?", device)
+    if not match:
+        return None
+    card_id, dev = match.group(1), int(match.group(2) or 0)
+    link = os.path.join("/proc/asound", card_id)
+    if not os.path.islink(link):
+        return None
+    return int(os.readlink(link).replace("card", "")), dev
+
+
+def find_output_device(audio, device):
+    card = alsa_card(device)
+    for i in range(audio.get_device_count()):
+        info = audio.get_device_info_by_index(i)
+        if info.get("maxOutputChannels", 0) <= 0:
+            continue
+        if card is not None and f"(hw:{card[0]},{card[1]})" in info["name"]:
+            return i
+    raise ValueError(f"No output device found for {device}")
+
+
+class Clip:
+    def __init__(self, samples, owner=None, allow_interrupt_from=None):
+        self.samples = samples  # int16, interleaved, already at the device rate
+        self.position = 0
+        self.owner = owner
+        self.allow_interrupt_from = set(allow_interrupt_from or [])
+        self.done = threading.Event()  # set when the last block was handed to PortAudio, or on stop
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def read(self, count):
+        part = self.samples[self.position:self.position + count]
+        self.position += len(part)
+        return part
+
+    def exhausted(self):
+        return self.position >= len(self.samples)
+
+
+class StreamClip(Clip):
+    def __init__(self, device, sample_rate, owner=None, allow_interrupt_from=None, jitter_seconds=0.15):
+        super().__init__(np.zeros(0, dtype=np.int16), owner, allow_interrupt_from)
+        self.device = device
+        self.source_rate = sample_rate
+        self.resampler = None
+        self.chunks = collections.deque()  # int16 in the device format, waiting to be played
+        self.buffered = 0
+        self.buffer_target = int(jitter_seconds * (device.sample_rate or 0)) * (device.channels or 1)
+        self.started = False
+        self.finished = False
+        self.underruns = 0  # blocks where synthesis had not caught up yet
+        self.lock = threading.Lock()
+
+    def feed(self, pcm):
+        if self.done.is_set():
+            return  # stopped or interrupted, drop the rest
+        if self.resampler is None:
+            self.resampler = StreamResampler(self.source_rate, self.device.sample_rate)
+        samples = self.device.to_device_format(self.resampler.process(pcm16_to_float32(pcm)))
+        with self.lock:
+            self.chunks.append(samples)
+            self.buffered += len(samples)
+
+    def finish(self):
+        with self.lock:
+            self.finished = True
+
+    def read(self, count):
+        with self.lock:
+            if not self.started:
+                if self.buffered < self.buffer_target and not self.finished:
+                    return self.samples  # still filling the jitter buffer
+                self.started = True
+            parts = []
+            while self.chunks and count > 0:
+                chunk = self.chunks[0]
+                part = chunk[:count]
+                if len(part) == len(chunk):
+                    self.chunks.popleft()
+                else:
+                    self.chunks[0] = chunk[count:]
+                parts.append(part)
+                count -= len(part)
+                self.buffered -= len(part)
+            if count > 0 and not self.finished:
+                self.underruns += 1
+        return np.concatenate(parts) if parts else self.samples
+
+    def exhausted(self):
+        with self.lock:
+            return self.finished and self.buffered == 0
+
+
+class OutputDevice:
+    def __init__(self, name, chunk=1024):
+        self.name = name  # ALSA name as used with aplay -D
+        self.chunk = chunk
+        self.lanes = {lane: collections.deque() for lane in LANES}
+        self.lock = threading.Lock()
+        self.audio = None
+        self.stream = None
+        self.device_index = None
+        self.sample_rate = None
+        self.channels = None
+        self.underruns = 0
+
+    def open(self):
+        # open the hw device at its own rate, so ALSA's plug layer does not resample every clip again
+        self.audio = pyaudio.PyAudio()
+        self.device_index = find_output_device(self.audio, self.name)
+        info = self.audio.get_device_info_by_index(self.device_index)
+        self.sample_rate = int(info["defaultSampleRate"])
+        self.channels = min(2, int(info["maxOutputChannels"]))
+        self.stream = self.audio.open(format=pyaudio.paInt16,
+                                      channels=self.channels,
+                                      rate=self.sample_rate,
+                                      output=True,
+                                      output_device_index=self.device_index,
+                                      frames_per_buffer=self.chunk,
+                                      stream_callback=self.callback)
+        print(f"[Output] {self.name}: {info['name']} open at {self.sample_rate} Hz, {self.channels} channel(s)")
+
+    def to_device_format(self, audio):
+        samples = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        if self.channels > 1:
+            samples = np.repeat(samples, self.channels)  # same signal on every channel, interleaved
+        return samples
+
+    def convert(self, pcm, sample_rate, channels=1):
+        return self.to_device_format(resample(pcm16_to_float32(pcm, channels), sample_rate, self.sample_rate))
+
+    def is_open(self):
+        return self.stream is not None
+
+    def play(self, pcm, sample_rate, lane="reply", owner=None, allow_interrupt_from=None, channels=1):
+        if not self.is_open():
+            print(f"[Output] {self.name} is not available, clip dropped")
+            clip = Clip(np.zeros(0, dtype=np.int16), owner, allow_interrupt_from)
+            clip.done.set()
+            return clip
+        return self.enqueue(Clip(self.convert(pcm, sample_rate, channels), owner, allow_interrupt_from), lane)
+
+    def play_stream(self, chunks, sample_rate, lane="reply", owner=None, allow_interrupt_from=None, jitter_seconds=0.15):
+        # mono int16 chunks at sample_rate, queued as they arrive; returns once the last chunk was fed
+        clip = StreamClip(self, sample_rate, owner, allow_interrupt_from, jitter_seconds)
+        if not self.is_open():
+            print(f"[Output] {self.name} is not available, clip dropped")
+            clip.done.set()
+        else:
+            self.enqueue(clip, lane)
+        try:
+            for chunk in chunks:
+                if clip.done.is_set():
+                    break  # stopped, the producer is closed and stops synthesizing
+                clip.feed(chunk)
+        finally:
+            clip.finish()
+        return clip
+
+    def enqueue(self, clip, lane="reply"):
+        with self.lock:
+            self.lanes[lane].append(clip)
+        return clip
+
+    def render(self, frames):
+        # the first clip of every lane, mixed into one block
+        out = np.zeros(frames * self.channels, dtype=np.int32)
+        finished = []
+        with self.lock:
+            for queue in self.lanes.values():
+                filled = 0
+                while queue and filled < len(out):
+                    clip = queue[0]
+                    part = clip.read(len(out) - filled)
+                    out[filled:filled + len(part)] += part
+                    filled += len(part)
+                    if clip.exhausted():
+                        finished.append(queue.popleft())  # the next clip continues in the same block
+                    elif filled < len(out):
+                        break  # a stream clip waiting for more audio, the rest of the block stays silent
+        for clip in finished:
+            clip.done.set()
+        return np.clip(out, -32768, 32767).astype(np.int16).tobytes()
+
+    def callback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paOutputUnderflow:
+            self.underruns += 1
+        return (self.render(frame_count), pyaudio.paContinue)
+
+    def stop(self, lane=None):
+        with self.lock:
+            stopped = []
+            for name in ([lane] if lane else LANES):
+                stopped.extend(self.lanes[name])
+                self.lanes[name].clear()
+        for clip in stopped:
+            clip.done.set()
+        return len(stopped)
+
+    def current(self, lane="prompt"):
+        with self.lock:
+            queue = self.lanes[lane]
+            return queue[0] if queue else None
+
+    def owner(self, lane="prompt"):
+        clip = self.current(lane)
+        return clip.owner if clip else None
+
+    def is_playing(self, lane=None):
+        with self.lock:
+            return any(self.lanes[name] for name in ([lane] if lane else LANES))
+
+    def interrupt(self, caller, lane="prompt"):
+        clip = self.current(lane)
+        if clip is None:
+            return True  # nothing is playing, so allow
+        if caller in clip.allow_interrupt_from:
+            self.stop(lane)
+            print(f"Audio interrupted by {caller}. Previous owner was {clip.owner}")
+            return True
+        print(f"Caller {caller} not allowed to interrupt current playback from {clip.owner}")
+        return False
+
+    def close(self):
+        self.stop()
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.audio is not None:
+            self.audio.terminate()
+            self.audio = None
+
+
+class OutputEngine:
+    def __init__(self, device_names, device_class=OutputDevice, **kwargs):
+        self.devices = {name: device_class(name, **kwargs) for name in device_names}
+
+    def open(self):
+        for name, device in self.devices.items():
+            try:
+                device.open()
+            except (OSError, ValueError) as e:
+                # like a failing aplay before: the rest of the translator keeps working
+                print(f"[Output] Could not open {name}: {e}")
+
+    def get(self, name):
+        return self.devices[name]
+
+    def close(self):
+        for device in self.devices.values():
+            device.close()
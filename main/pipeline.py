@@ -0,0 +1,145 @@
+# Function: sentence level STT -> translation -> TTS -> playback pipeline
+# Every stage runs in its own thread and hands sentences (split per language, see segmentation.py) to the next one, so
+# sentence N is played while sentence N+1 is synthesized and sentence N+2 is translated. Sentences that queued up
+# while the previous translation ran are translated together in one call (one batch, see translation_batcher.py).
+# Recognized text can be submitted while the button is still held (streaming STT),
+# playback waits until release() so the listener does not hear the reply before the speaker finished.
+# With streaming TTS synthesize() returns an iterator of PCM chunks instead of bytes: the chunks are handed
+# to playback as they come, so a sentence starts playing while piper is still working on its end.
+import queue
+import threading
+import time
+from segmentation import join_sentences, split_sentences
+
+
+class SentencePipeline:
+    def __init__(self, source, target, device, translate, synthesize, play, hold_playback=True):
+        self.source = source
+        self.target = target
+        self.device = device
+        self.translate = translate    # translate(source, target, sentences) -> list of translations
+        self.synthesize = synthesize  # synthesize(text, lang_code) -> (pcm bytes or iterator of chunks, sample_rate)
+        self.play = play              # play(pcm bytes or iterator of chunks, sample_rate, device), blocks until played
+        self.translate_queue = queue.Queue()
+        self.synth_queue = queue.Queue()
+        self.play_queue = queue.Queue()
+        self.playback_allowed = threading.Event()
+        if not hold_playback:
+            self.playback_allowed.set()
+        self.cancelled = False
+        self.closed = False
+        self.translations = []
+        self.stage_times = {"translation": 0.0, "tts": 0.0, "playback": 0.0}
+        self.first_audio = None
+        self.threads = [threading.Thread(target=self.translate_worker, daemon=True),
+                        threading.Thread(target=self.synth_worker, daemon=True),
+                        threading.Thread(target=self.play_worker, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, text):
+        for sentence in split_sentences(text, self.source):
+            self.translate_queue.put(sentence)
+
+    def release(self):
+        self.playback_allowed.set()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.translate_queue.put(None)  # end of utterance
+
+    def cancel(self):
+        self.cancelled = True
+        self.close()
+        self.release()
+
+    def wait(self):
+        # close the utterance, wait until the last sentence was played and return the whole translation
+        self.close()
+        self.release()
+        for thread in self.threads:
+            thread.join()
+        return join_sentences(self.translations, self.target)
+
+    def translate_worker(self):
+        while True:
+            sentences = [self.translate_queue.get()]
+            while sentences[-1] is not None:
+                try:
+                    sentences.append(self.translate_queue.get_nowait())
+                except queue.Empty:
+                    break
+            end = sentences[-1] is None
+            sentences = [sentence for sentence in sentences if sentence is not None]
+            if sentences and not self.cancelled:
+                try:
+                    t0 = time.time()
+                    translations = self.translate(self.source, self.target, sentences)
+                    self.stage_times["translation"] += time.time() - t0
+                    for sentence, translation in zip(sentences, translations):
+                        print(f"[Pipeline] {sentence} -> {translation}")
+                        self.translations.append(translation)
+                        self.synth_queue.put(translation)
+                except Exception as e:
+                    print(f"[Pipeline] Translation failed: {e}")
+            if end:
+                self.synth_queue.put(None)
+                return
+
+    def synth_worker(self):
+        while True:
+            translation = self.synth_queue.get()
+            if translation is None:
+                self.play_queue.put(None)
+                return
+            if self.cancelled:
+                continue
+            try:
+                t0 = time.time()
+                pcm, sample_rate = self.synthesize(translation, self.target)
+                if isinstance(pcm, (bytes, bytearray)):
+                    self.play_queue.put((pcm, sample_rate))
+                else:
+                    self.forward_stream(pcm, sample_rate)
+                self.stage_times["tts"] += time.time() - t0
+            except Exception as e:
+                print(f"[Pipeline] TTS failed: {e}")
+
+    def forward_stream(self, chunks, sample_rate):
+        # playback gets a queue right away and reads it while this thread keeps synthesizing
+        forwarded = queue.Queue()
+        self.play_queue.put((forwarded, sample_rate))
+        try:
+            for chunk in chunks:
+                if self.cancelled:
+                    break
+                forwarded.put(chunk)
+        finally:
+            forwarded.put(None)
+
+    def play_worker(self):
+        while True:
+            item = self.play_queue.get()
+            if item is None:
+                return
+            self.playback_allowed.wait()
+            if self.cancelled:
+                continue
+            pcm, sample_rate = item
+            if isinstance(pcm, queue.Queue):
+                pcm = self.stream_chunks(pcm)
+            try:
+                if self.first_audio is None and isinstance(pcm, (bytes, bytearray)):
+                    self.first_audio = time.time()
+                t0 = time.time()
+                self.play(pcm, sample_rate, self.device)
+                self.stage_times["playback"] += time.time() - t0
+            except Exception as e:
+                print(f"[Pipeline] Playback failed: {e}")
+
+    def stream_chunks(self, forwarded):
+        for chunk in iter(forwarded.get, None):
+            if self.first_audio is None:
+                self.first_audio = time.time()
+            yield chunk
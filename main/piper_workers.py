@@ -0,0 +1,321 @@
+# Function: long-lived Piper processes, one per voice
+# Each worker starts the piper binary once (ONNX voice, espeak-ng and onnxruntime stay loaded) and then
+# receives one line of text per utterance on stdin. Piper writes the audio into a scratch folder in RAM
+# (/dev/shm) and prints the file path, which we read back as raw 16-bit PCM.
+# A worker that crashes is started again automatically.
+# PiperStreamWorker (streaming=True) runs piper with --output_raw instead: the PCM of every sentence
+# piper finishes is read from stdout right away, so playback can start before the whole line is done.
+import json
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from memory_usage import get_rss_mb
+from metrics import metrics
+
+PIPER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "piper_rebuild", "piper")
+PIPER_PATH = os.path.join(PIPER_DIR, "piper")
+
+piper_models = {
+    "zh": {
+        "model": "zh_CN-huayan-medium.onnx",
+        "config": "zh_CN-huayan-medium.onnx.json"
+    },
+    "en": {
+        "model": "en_US-john-medium.onnx",
+        "config": "en_US-john-medium.onnx.json"
+    },
+    "de": {
+        "model": "de_DE-thorsten-medium.onnx",
+        "config": "de_DE-thorsten-medium.onnx.json"
+    }
+}
+
+WARMUP_TEXT = {"en": "Hello.", "de": "Hallo.", "zh": "你好。"}
+
+discarded_bytes = metrics.counter("translator_piper_discarded_bytes_total",
+                                  "PCM bytes of a streamed line that arrived after the line was considered complete",
+                                  labels=("lang",))
+
+
+def default_scratch_dir():
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()  # tmpfs, keeps the SD card out of it
+    path = os.path.join(base, "offline_translator_piper")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class PiperWorker:
+    def __init__(self, lang_code, model_path, config_path, piper_path=PIPER_PATH, scratch_dir=None):
+        self.lang_code = lang_code
+        self.model_path = model_path
+        self.config_path = config_path
+        self.piper_path = piper_path
+        self.scratch_dir = scratch_dir or default_scratch_dir()
+        self.process = None
+        self.restarts = 0
+        self.parked = False  # stopped on purpose to free memory, the monitor leaves it alone
+        self.lock = threading.Lock()  # one utterance at a time per voice
+        with open(config_path, encoding="utf-8") as f:
+            config = json.load(f)
+        self.sample_rate = config.get("audio", {}).get("sample_rate", 22050)
+        self.inference = config.get("inference", {})  # length/noise scales piper uses for this voice
+
+    def start(self):
+        command = [
+            self.piper_path,
+            "--model", self.model_path,
+            "--config", self.config_path,
+            "--output_dir", self.scratch_dir,
+        ]
+        t0 = time.time()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        print(f"[Piper] Worker for '{self.lang_code}' started (pid {self.process.pid}) in {time.time() - t0:.2f} seconds")
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def restart(self):
+        self.stop()
+        self.parked = False  # needed again
+        self.restarts += 1
+        print(f"[Piper] Restarting worker for '{self.lang_code}' (restart #{self.restarts})")
+        self.start()
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def synthesize(self, text):
+        # returns the utterance as mono int16 PCM bytes at self.sample_rate
+        line = " ".join(text.split())  # piper reads one utterance per line
+        if not line:
+            return b""
+        with self.lock:
+            for attempt in range(2):
+                if not self.is_alive():
+                    self.restart()
+                try:
+                    self.process.stdin.write((line + "\n").encode("utf-8"))
+                    self.process.stdin.flush()
+                    reply = self.process.stdout.readline()
+                    if not reply:
+                        raise RuntimeError("piper exited while synthesizing")
+                    return self.read_and_remove(reply.decode("utf-8").strip())
+                except (OSError, RuntimeError, wave.Error) as e:
+                    print(f"[Piper] Worker for '{self.lang_code}' failed: {e}")
+                    self.stop()
+            raise RuntimeError(f"Piper worker for '{self.lang_code}' could not synthesize text")
+
+    def read_and_remove(self, wav_path):
+        try:
+            with wave.open(wav_path, "rb") as wf:
+                self.sample_rate = wf.getframerate()
+                return wf.readframes(wf.getnframes())
+        finally:
+            if os.path.exists(wav_path):
+                os.remove(wav_path)
+
+
+class PiperStreamWorker(PiperWorker):
+    # piper logs this on stderr after its raw output thread has written (and joined) the whole line;
+    # "Waiting for audio to finish playing" comes before that join and may be ahead of the last PCM
+    END_OF_LINE = b"Real-time factor"
+    ROUTINE = (b"Waiting for audio to finish playing",)  # logged for every line, not worth printing
+    LINE_END = object()  # put into the chunk queue by the stderr reader, a waiting next_chunk() wakes up for it
+
+    def __init__(self, lang_code, model_path, config_path, piper_path=PIPER_PATH, scratch_dir=None,
+                 first_chunk_timeout=30.0, drain_timeout=0.05):
+        super().__init__(lang_code, model_path, config_path, piper_path, scratch_dir)
+        self.first_chunk_timeout = first_chunk_timeout  # a long sentence takes a few seconds on the Pi
+        self.drain_timeout = drain_timeout  # after END_OF_LINE, stdout only has what is already in the pipe
+        self.chunks = queue.Queue()
+        self.line_done = threading.Event()  # LINE_END of the current line was read from the queue
+
+    def start(self):
+        command = [
+            self.piper_path,
+            "--model", self.model_path,
+            "--config", self.config_path,
+            "--output_raw",
+        ]
+        t0 = time.time()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.chunks = queue.Queue()
+        threading.Thread(target=self.read_stdout, args=(self.process, self.chunks), daemon=True).start()
+        threading.Thread(target=self.read_stderr, args=(self.process, self.chunks), daemon=True).start()
+        print(f"[Piper] Streaming worker for '{self.lang_code}' started (pid {self.process.pid}) in {time.time() - t0:.2f} seconds")
+
+    def read_stdout(self, process, chunks):
+        fd = process.stdout.fileno()
+        while True:
+            data = os.read(fd, 4096)
+            if not data:
+                chunks.put(None)  # piper exited
+                return
+            chunks.put(data)
+
+    def read_stderr(self, process, chunks):
+        for line in process.stderr:
+            if self.END_OF_LINE in line:
+                chunks.put(self.LINE_END)
+            elif not any(routine in line for routine in self.ROUTINE):  # errors and warnings must stay visible
+                print(f"[Piper] {self.lang_code}: {line.decode('utf-8', errors='replace').rstrip()}")
+
+    def next_chunk(self, chunks):
+        # next piece of stdout, None once the line is complete
+        while True:
+            timeout = self.drain_timeout if self.line_done.is_set() else self.first_chunk_timeout
+            try:
+                data = chunks.get(timeout=timeout)
+            except queue.Empty:
+                if self.line_done.is_set():
+                    return None
+                raise RuntimeError("piper stopped producing audio")
+            if data is self.LINE_END:
+                self.line_done.set()  # only what is already in the stdout pipe can still follow
+                continue
+            if data is None:
+                raise RuntimeError("piper exited while synthesizing")
+            return data
+
+    def stream(self, text):
+        # yields mono int16 PCM chunks at self.sample_rate while piper is still synthesizing
+        line = " ".join(text.split())
+        if not line:
+            return
+        with self.lock:
+            if not self.is_alive():
+                self.restart()
+            chunks = self.chunks
+            leftovers = 0
+            while not chunks.empty():
+                data = chunks.get_nowait()  # the end of the previous line, read too late to be played
+                leftovers += len(data) if isinstance(data, bytes) else 0
+            if leftovers:
+                discarded_bytes.inc(leftovers, lang=self.lang_code)
+                print(f"[Piper] Discarded {leftovers} bytes left over from the previous '{self.lang_code}' line")
+            self.line_done.clear()
+            pending = b""
+            complete = False
+            try:
+                self.process.stdin.write((line + "\n").encode("utf-8"))
+                self.process.stdin.flush()
+                while True:
+                    data = self.next_chunk(chunks)
+                    if data is None:
+                        complete = True
+                        return
+                    data = pending + data
+                    cut = len(data) - len(data) % 2  # os.read may split a sample
+                    pending = data[cut:]
+                    if cut:
+                        yield data[:cut]
+            except (OSError, RuntimeError) as e:
+                # part of the line may already be playing, so no retry, the monitor restarts piper
+                print(f"[Piper] Streaming worker for '{self.lang_code}' failed: {e}")
+                self.stop()
+                complete = True
+                raise RuntimeError(f"Piper worker for '{self.lang_code}' could not synthesize text") from e
+            finally:
+                if not complete:
+                    # the reader stopped early (reply cancelled): let piper finish the line, or the next
+                    # line would start with the rest of this one
+                    try:
+                        while self.next_chunk(chunks) is not None:
+                            pass
+                    except RuntimeError:
+                        self.stop()
+
+    def synthesize(self, text):
+        return b"".join(self.stream(text))
+
+
+class PiperWorkerPool:
+    def __init__(self, models=None, piper_dir=PIPER_DIR, piper_path=PIPER_PATH, check_interval=1.0, streaming=False):
+        self.models = models or piper_models
+        self.streaming = streaming
+        worker_class = PiperStreamWorker if streaming else PiperWorker
+        self.workers = {}
+        for lang_code, voice in self.models.items():
+            self.workers[lang_code] = worker_class(lang_code,
+                                                   os.path.join(piper_dir, voice["model"]),
+                                                   os.path.join(piper_dir, voice["config"]),
+                                                   piper_path=piper_path)
+        self.check_interval = check_interval
+        self.running = False
+        self.monitor_thread = None
+
+    def start(self):
+        for worker in self.workers.values():
+            worker.start()
+        self.running = True
+        self.monitor_thread = threading.Thread(target=self.monitor_loop, daemon=True)
+        self.monitor_thread.start()
+
+    def monitor_loop(self):
+        # restart crashed workers in the background so the next reply does not pay for it
+        while self.running:
+            time.sleep(self.check_interval)
+            for worker in self.workers.values():
+                if not worker.parked and not worker.is_alive() and worker.lock.acquire(blocking=False):
+                    try:
+                        if self.running and not worker.parked and not worker.is_alive():
+                            worker.restart()
+                    finally:
+                        worker.lock.release()
+
+    def warmup(self):
+        # piper loads its voice while the other workers start, the first line still pays for espeak-ng and
+        # onnxruntime setup, so send one short sentence to every voice
+        t0 = time.time()
+        for lang_code, worker in self.workers.items():
+            worker.synthesize(WARMUP_TEXT.get(lang_code, "Hello."))
+        print(f"[Piper] {len(self.workers)} voices warmed up in {time.time() - t0:.2f} seconds")
+
+    def synthesize(self, lang_code, text):
+        worker = self.workers[lang_code]
+        return worker.synthesize(text), worker.sample_rate
+
+    def park(self, lang_code):
+        # stop a voice to free its memory until unpark()
+        worker = self.workers[lang_code]
+        with worker.lock:
+            worker.parked = True
+            worker.stop()
+
+    def unpark(self, lang_code):
+        worker = self.workers[lang_code]
+        with worker.lock:
+            worker.parked = False
+            if not worker.is_alive():
+                worker.start()
+        worker.synthesize(WARMUP_TEXT.get(lang_code, "Hello."))
+
+    def worker_rss_mb(self, lang_code):
+        worker = self.workers[lang_code]
+        return get_rss_mb(worker.process.pid) if worker.is_alive() else 0.0
+
+    def stream(self, lang_code, text):
+        # (iterator of PCM chunks, sample_rate), only with streaming=True
+        worker = self.workers[lang_code]
+        return worker.stream(text), worker.sample_rate
+
+    def stop(self):
+        self.running = False
+        for worker in self.workers.values():
+            with worker.lock:
+                worker.stop()
@@ -0,0 +1,39 @@
+# Function: language prompts (languages/*.wav) kept in memory, ready to play
+# All entries of audio_map are read once at start and converted to every speaker's native rate and
+# channel count, so a press of button3/4 only queues samples that already exist: no SD card read,
+# no WAV parsing and no resampling on the way to the speaker.
+import time
+import wave
+from output_engine import Clip
+
+
+class PromptBank:
+    def __init__(self, paths, speakers):
+        self.paths = dict(paths)        # key ("t_en", "zh_de", "default", ...) -> WAV file
+        self.speakers = list(speakers)  # OutputDevices, opened (their rate is known)
+        self.samples = {}               # (key, speaker name) -> int16 samples in the speaker's format
+
+    def load(self):
+        t0 = time.time()
+        for key, path in self.paths.items():
+            try:
+                with wave.open(path, "rb") as wf:
+                    pcm = wf.readframes(wf.getnframes())
+                    sample_rate, channels = wf.getframerate(), wf.getnchannels()
+            except (OSError, EOFError, wave.Error) as e:
+                print(f"[Prompts] Could not load {path}: {e}")
+                continue
+            for speaker in self.speakers:
+                if speaker.is_open():
+                    self.samples[(key, speaker.name)] = speaker.convert(pcm, sample_rate, channels)
+        size_kb = sum(s.nbytes for s in self.samples.values()) / 1024
+        print(f"[Prompts] {len(self.samples)} prompts ready in {time.time() - t0:.2f} seconds ({size_kb:.0f} KB)")
+
+    def has(self, key, speaker):
+        return (key, speaker.name) in self.samples
+
+    def play(self, key, speaker, owner=None, allow_interrupt_from=None):
+        samples = self.samples.get((key, speaker.name))
+        if samples is None:
+            return None
+        return speaker.enqueue(Clip(samples, owner, allow_interrupt_from), lane="prompt")
@@ -0,0 +1,93 @@
+# Function: translate and synthesize a reply the way the service does, shared with benchmark.py
+# Translation: the translation memory answers sentences it has seen before, the rest of a request (all sentences a
+# pipeline has waiting) goes through the batcher (translation_batcher.py) into
+# ArgosTranslationEngine.translate_sentences(). The batch, not every caller, waits for the fair CPU slot and keeps
+# its models resident (model_residency.py).
+# Synthesis: the TTS cache answers replies it has seen before, otherwise piper synthesizes them (an iterator of
+# PCM chunks with a streaming pool). The voice stays resident while piper works, finished replies are cached.
+from contextlib import nullcontext
+from translation_batcher import TranslationBatcher
+from tts_cache import cache_key
+
+
+class ReplyPath:
+    def __init__(self, translation_engine, piper_pool, residency, scheduler=None, translation_memory=None,
+                 tts_cache=None, batch_window_seconds=0.0, max_batch=16, on_synthesized=None):
+        self.translation_engine = translation_engine
+        self.piper_pool = piper_pool
+        self.residency = residency
+        self.scheduler = scheduler                    # None: nothing else competes for the CPU (benchmark)
+        self.translation_memory = translation_memory  # None: disabled
+        self.tts_cache = tts_cache                    # None: disabled
+        self.on_synthesized = on_synthesized          # on_synthesized(pcm, sample_rate, lang_code), e.g. save a WAV
+        self.batcher = TranslationBatcher(self.translate_batch, batch_window_seconds, max_batch)
+
+    def translate_batch(self, source_lang_code, target_lang_code, sentences):
+        slot = self.scheduler.slot("translation") if self.scheduler else nullcontext()
+        with slot, self.residency.use(*self.translation_engine.step_names(source_lang_code, target_lang_code)):
+            return self.translation_engine.translate_sentences(source_lang_code, target_lang_code, sentences)
+
+    def translate_sentences(self, source_lang_code, target_lang_code, sentences):
+        # one translation per sentence, the ones the memory does not know are translated in one request
+        translations = [None] * len(sentences)
+        if self.translation_memory:
+            for i, sentence in enumerate(sentences):
+                translations[i] = self.translation_memory.lookup(source_lang_code, target_lang_code, sentence)
+        missing = [i for i, translation in enumerate(translations) if translation is None]
+        if not missing:
+            return translations
+        if not self.translation_engine.has_pair(source_lang_code, target_lang_code):
+            error = self.translation_engine.translate(source_lang_code, target_lang_code, "")  # the error message
+            return [error if translation is None else translation for translation in translations]
+        new = self.batcher.translate(source_lang_code, target_lang_code, [sentences[i] for i in missing])
+        for i, translation in zip(missing, new):
+            translations[i] = translation
+            if self.translation_memory:
+                self.translation_memory.add(source_lang_code, target_lang_code, sentences[i], translation)
+        return translations
+
+    def tts_cache_key(self, text, lang_code):
+        worker = self.piper_pool.workers[lang_code]
+        params = {"inference": worker.inference, "sample_rate": worker.sample_rate}
+        return cache_key(worker.model_path, worker.config_path, params, text)
+
+    def synthesis_finished(self, pcm, sample_rate, lang_code, key):
+        if key:
+            self.tts_cache.put(key, pcm, sample_rate)
+        if self.on_synthesized:
+            self.on_synthesized(pcm, sample_rate, lang_code)
+
+    def collect_stream(self, chunks, sample_rate, lang_code, key):
+        # only a stream that was read to the end is cached, a cancelled reply is incomplete
+        collected = []
+        for chunk in chunks:
+            collected.append(chunk)
+            yield chunk
+        self.synthesis_finished(b"".join(collected), sample_rate, lang_code, key)
+
+    def resident_stream(self, name, chunks):
+        # the voice must not be unloaded while piper is still producing this reply
+        with self.residency.use(name):
+            yield from chunks
+
+    def synthesize_speech(self, text, lang_code):
+        # returns (pcm bytes, rate), or with a streaming pool (iterator of pcm chunks, rate) unless it was cached
+        key = None
+        if self.tts_cache and self.tts_cache.cacheable(text):
+            key = self.tts_cache_key(text, lang_code)
+            cached = self.tts_cache.get(key)
+            if cached:
+                return cached
+        if self.piper_pool.streaming:
+            chunks, sample_rate = self.piper_pool.stream(lang_code, text)
+            chunks = self.resident_stream(f"piper:{lang_code}", chunks)
+            if key or self.on_synthesized:
+                chunks = self.collect_stream(chunks, sample_rate, lang_code, key)
+            return chunks, sample_rate
+        with self.residency.use(f"piper:{lang_code}"):
+            pcm, sample_rate = self.piper_pool.synthesize(lang_code, text)
+        self.synthesis_finished(pcm, sample_rate, lang_code, key)
+        return pcm, sample_rate
+
+    def close(self):
+        self.batcher.close()
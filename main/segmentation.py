@@ -0,0 +1,105 @@
+# Function: split recognized text into sentences before translation
+# Whisper returns a whole utterance as one string. Translation models are trained on single sentences,
+# take longer than linear on long inputs and cut off what does not fit (MarianMT: 512 tokens), so the text is
+# split per language:
+#   en / de  after . ! ? followed by a space, not after common abbreviations ("Mr.", "z.B.", "Nr.") or numbers ("3."),
+#            nor after an initial ("John F. Kennedy"; but "Plan B. Next", "So did I. Then" are two sentences)
+#   zh       directly after full-width 。！？； (no spaces between Chinese sentences)
+# A sentence that is still longer than max_chars (a run-on without punctuation) is split after commas,
+# and as a last resort between words, so nothing has to be truncated.
+import re
+
+# split after . ! ? (and a closing quote) followed by a space, or directly after a run of Chinese full-width
+# terminators and closing quotes ("？！", "。”" are one boundary); an ellipsis ("...", "……") is a pause, not an end
+SENTENCE_END = re.compile(r'(?<=[.!?])(?<!\.\.\.)\s+|(?<=[.!?]["\'”’)])\s+'
+                          r'|(?<=[。！？；])(?![。！？；…”」』])|(?<=[。！？；][”」』])(?![。！？；…”」』])')
+PUNCTUATION_ONLY = re.compile(r'^[\W_]+$')
+CLAUSE_END = re.compile(r'(?<=[,;:])\s+|(?<=[，、；：])')
+
+ABBREVIATIONS = {
+    "en": {"mr", "mrs", "ms", "dr", "prof", "st", "no", "vs", "etc", "e.g", "i.e", "approx", "a.m", "p.m"},
+    "de": {"z.b", "bzw", "ca", "nr", "str", "dr", "prof", "usw", "evtl", "ggf", "d.h", "u.a", "hr", "fr"},
+}
+
+# a capitalised word after a single letter is taken as the rest of a name ("F. Kennedy") unless it usually starts a sentence
+SENTENCE_STARTERS = {
+    "en": {"the", "a", "an", "and", "but", "so", "then", "next", "now", "also", "i", "we", "you", "he", "she", "it",
+           "they", "this", "that", "there", "what", "when", "where", "why", "how", "who", "please", "yes", "no",
+           "ok", "okay", "thanks", "thank", "let", "can", "could", "do", "does", "is", "are"},
+    "de": {"der", "die", "das", "ein", "eine", "und", "aber", "also", "dann", "danach", "jetzt", "ich", "wir", "du",
+           "sie", "er", "es", "ihr", "man", "wie", "was", "wo", "wann", "warum", "wer", "bitte", "ja", "nein",
+           "danke", "gibt", "kann", "können", "ist", "sind"},
+}
+
+MAX_CHARS = 300  # about 100 Marian tokens in English, still below the 512 limit for Chinese (one character ~ one token)
+
+
+def is_initial(letter, following, language):
+    if not following or (letter == "I" and language == "en"):
+        return False  # "So did I."
+    word = following.split()[0].strip("\"'“”‘’(")
+    if word[:1].islower():
+        return True  # the sentence goes on ("Frankfurt a. M." is not cut either)
+    return word[:1].isupper() and word.lower() not in SENTENCE_STARTERS.get(language, ())
+
+
+def ends_with_abbreviation(part, language, following=None):
+    words = part.split()
+    if not words or not part.endswith("."):
+        return False
+    last = words[-1].rstrip(".")
+    if last.isdigit():
+        return language == "de"  # "am 3. Mai", in English "in 2024." ends the sentence
+    if len(last) == 1 and last.isalpha():
+        return is_initial(last, following, language)
+    return last.lower() in ABBREVIATIONS.get(language, ())
+
+
+def split_long(sentence, max_chars):
+    if len(sentence) <= max_chars:
+        return [sentence]
+    pieces = []
+    for clause in CLAUSE_END.split(sentence):
+        if pieces and len(pieces[-1]) + len(clause) + 1 <= max_chars:
+            pieces[-1] = f"{pieces[-1]} {clause}" if " " in sentence else pieces[-1] + clause
+        elif len(clause) <= max_chars:
+            pieces.append(clause)
+        elif " " in clause:
+            words, current = clause.split(), ""
+            for word in words:
+                if current and len(current) + len(word) + 1 > max_chars:
+                    pieces.append(current)
+                    current = word
+                else:
+                    current = f"{current} {word}" if current else word
+            pieces.append(current)
+        else:
+            pieces.extend(clause[i:i + max_chars] for i in range(0, len(clause), max_chars))
+    return pieces
+
+
+def split_sentences(text, language=None, max_chars=MAX_CHARS):
+    sentences = []
+    pending = ""
+    parts = [part.strip() for part in SENTENCE_END.split(text) if part and part.strip()]
+    for i, part in enumerate(parts):
+        if PUNCTUATION_ONLY.match(part):
+            # a stray "!" belongs to the sentence before it, it is not a sentence of its own (nor is a leading one)
+            if pending:
+                pending += part
+            elif sentences:
+                sentences[-1] += part
+            continue
+        pending = f"{pending} {part}" if pending else part
+        following = next((p for p in parts[i + 1:] if not PUNCTUATION_ONLY.match(p)), None)
+        if not ends_with_abbreviation(pending, language, following):
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        sentences.append(pending)
+    return [piece for sentence in sentences for piece in split_long(sentence, max_chars)]
+
+
+def join_sentences(sentences, language):
+    separator = "" if language == "zh" else " "
+    return separator.join(sentences)
@@ -0,0 +1,221 @@
+# Function: run the translator without GPIO and without sound cards
+#   use_mock_pins()        gpiozero MockFactory instead of the Raspberry Pi pins
+#   FileCaptureEngine      drop-in for CaptureEngine, plays WAV files into the ring buffer in real time
+#   SimulatedOutputDevice  speaker replacement: discards audio (null) or writes one WAV per clip (file)
+#   ScenarioDriver         presses, holds and releases buttons on a timeline read from a JSON file
+#
+# Scenario file, times in seconds from the start:
+#   {"repeat": 1, "period": 20,
+#    "events": [
+#      {"t": 0.5, "button": "button3", "action": "press"},
+#      {"t": 2.0, "button": "button1", "action": "hold", "duration": 4.0, "wav": "../corpus/ticket_en.wav"},
+#      {"t": 3.0, "button": "button2", "action": "hold", "duration": 3.0, "wav": "../corpus/reply_de.wav"}]}
+# How to run (from main/):
+#   OFFLINE_TRANSLATOR_SIMULATION=1 SIMULATION_SCENARIO=../scenario.json python3 button4312_Argos_friday.py
+import collections
+import json
+import os
+import threading
+import time
+import wave
+import numpy as np
+from audio_utils import pcm16_to_float32, resample, write_wav_async
+from capture_engine import RingBuffer
+from output_engine import OutputDevice
+
+
+def use_mock_pins():
+    from gpiozero import Device
+    from gpiozero.pins.mock import MockFactory
+    Device.pin_factory = MockFactory()
+    print("[Simulation] Using gpiozero MockFactory, no GPIO needed")
+    return Device.pin_factory
+
+
+def load_wav_int16(path, sample_rate):
+    # any 16-bit WAV, converted to mono int16 at the rate the "mic" runs at
+    with wave.open(path, "rb") as wf:
+        pcm = wf.readframes(wf.getnframes())
+        rate = wf.getframerate()
+        channels = wf.getnchannels()
+    audio = resample(pcm16_to_float32(pcm, channels), rate, sample_rate)
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+class FileCaptureEngine:
+    def __init__(self, mic_name=None, sample_rate=48000, channels=1, chunk=1024, max_seconds=60,
+                 always_on=False, preroll_seconds=0.5):
+        self.sample_rate = sample_rate
+        self.channels = 1  # files are mixed down to mono
+        self.chunk = chunk
+        self.device_index = -1
+        self.device_name = f"sim_{mic_name or 'mic'}".replace(" ", "_")
+        self.always_on = always_on
+        self.preroll_samples = int(preroll_seconds * sample_rate)
+        self.ring = RingBuffer(int((max_seconds + preroll_seconds) * sample_rate))
+        self.capturing = False
+        self.capture_start = 0
+        self.capture_end = 0
+        self.overflows = 0
+        self.dropped_frames = 0
+        self.pending_files = collections.deque()
+        self.current = None
+        self.current_pos = 0
+        self.running = False
+        self.thread = None
+
+    def queue_file(self, path):
+        # the next button press "speaks" this file
+        self.pending_files.append(load_wav_int16(path, self.sample_rate))
+
+    def open(self):
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.feed_loop, daemon=True)
+        self.thread.start()
+
+    def feed_loop(self):
+        # behaves like the PortAudio callback: one block every chunk / sample_rate seconds
+        interval = self.chunk / self.sample_rate
+        next_time = time.time()
+        while self.running:
+            next_time += interval
+            if self.capturing or self.always_on:
+                block = np.zeros(self.chunk, dtype=np.int16)
+                if self.capturing and self.current is not None:
+                    part = self.current[self.current_pos:self.current_pos + self.chunk]
+                    block[:len(part)] = part
+                    self.current_pos += len(part)
+                self.ring.write(block)
+            time.sleep(max(0.0, next_time - time.time()))
+
+    def start(self):
+        if self.capturing:
+            return
+        self.open()
+        self.current = self.pending_files.popleft() if self.pending_files else None
+        self.current_pos = 0
+        if self.always_on:
+            self.capture_start = max(self.ring.total_written - self.preroll_samples, self.ring.oldest_position())
+        else:
+            self.capture_start = self.ring.total_written
+        self.capturing = True
+
+    def stop(self):
+        if not self.capturing:
+            return b""
+        self.capturing = False
+        self.capture_end = self.ring.total_written
+        return self.ring.read(self.capture_start, self.capture_end).tobytes()
+
+    def close(self):
+        self.capturing = False
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+
+class SimulatedOutputDevice(OutputDevice):
+    # a speaker without a sound card: the same lanes and mixer as OutputDevice, paced by a thread instead of
+    # PortAudio, so clips take as long as real playback and speaker contention stays realistic
+    def __init__(self, name, chunk=1024, mode="null", folder=None, sample_rate=48000):
+        super().__init__(name, chunk)
+        self.mode = mode  # "null" drops the audio, "file" also writes every clip as a WAV
+        self.folder = folder or os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "output", "simulation")
+        self.simulated_rate = sample_rate
+        self.count = 0
+        self.running = False
+        self.thread = None
+
+    def open(self):
+        self.sample_rate = self.simulated_rate
+        self.channels = 1
+        self.running = True
+        self.thread = threading.Thread(target=self.drain_loop, daemon=True)
+        self.thread.start()
+        print(f"[Simulation] Speaker {self.name}: {self.mode} sink at {self.sample_rate} Hz")
+
+    def is_open(self):
+        return self.running
+
+    def drain_loop(self):
+        interval = self.chunk / self.sample_rate
+        next_time = time.time()
+        while self.running:
+            next_time += interval
+            self.render(self.chunk)
+            time.sleep(max(0.0, next_time - time.time()))
+
+    def save_clip(self, pcm, sample_rate, lane, channels=1):
+        self.count += 1
+        safe_name = "".join(c if c.isalnum() else "_" for c in self.name)
+        write_wav_async(os.path.join(self.folder, f"{safe_name}_{lane}_{self.count:04d}.wav"), pcm, sample_rate, channels)
+
+    def play(self, pcm, sample_rate, lane="reply", owner=None, allow_interrupt_from=None, channels=1):
+        if self.mode == "file":
+            self.save_clip(pcm, sample_rate, lane, channels)
+        return super().play(pcm, sample_rate, lane, owner, allow_interrupt_from, channels)
+
+    def play_stream(self, chunks, sample_rate, lane="reply", owner=None, allow_interrupt_from=None, jitter_seconds=0.15):
+        if self.mode != "file":
+            return super().play_stream(chunks, sample_rate, lane, owner, allow_interrupt_from, jitter_seconds)
+        collected = []
+
+        def tee():
+            for chunk in chunks:
+                collected.append(chunk)
+                yield chunk
+        clip = super().play_stream(tee(), sample_rate, lane, owner, allow_interrupt_from, jitter_seconds)
+        self.save_clip(b"".join(collected), sample_rate, lane)
+        return clip
+
+    def close(self):
+        self.stop()
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+
+class ScenarioDriver:
+    def __init__(self, buttons, engines):
+        self.buttons = buttons  # "button1" -> gpiozero Button on a mock pin
+        self.engines = engines  # "button1" -> FileCaptureEngine that gets the WAV of a press
+
+    def load(self, path):
+        with open(path, encoding="utf-8") as f:
+            scenario = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(path))
+        events = []
+        repeat = scenario.get("repeat", 1)
+        period = scenario.get("period", 0)
+        for n in range(repeat):
+            for event in scenario["events"]:
+                t = event["t"] + n * period
+                wav = event.get("wav")
+                if wav and not os.path.isabs(wav):
+                    wav = os.path.join(base_dir, wav)
+                if event["action"] == "hold":
+                    events.append((t, event["button"], "press", wav))
+                    events.append((t + event["duration"], event["button"], "release", None))
+                else:
+                    events.append((t, event["button"], event["action"], wav))
+        return sorted(events, key=lambda e: e[0])
+
+    def run(self, path):
+        events = self.load(path)
+        print(f"[Simulation] Running {len(events)} button events from {path}")
+        t_start = time.time()
+        for t, name, action, wav in events:
+            time.sleep(max(0.0, t_start + t - time.time()))
+            pin = self.buttons[name].pin
+            if action == "press":
+                if wav and name in self.engines:
+                    self.engines[name].queue_file(wav)
+                pin.drive_low()  # buttons are pull_up, pressed means low
+            else:
+                pin.drive_high()
+            print(f"[Simulation] t={time.time() - t_start:.2f}s {name} {action}")
+        return time.time() - t_start
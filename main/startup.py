@@ -0,0 +1,92 @@
+# Function: staged startup for the systemd service
+#   1. GPIO and the prompt speaker come up first, so the buttons and default.wav work within a second or two
+#   2. STT, translation and TTS load in parallel background threads, each runs one dummy inference
+#   3. only when all of them are warm systemd gets READY=1 (Type=notify in offline_translator.service)
+# Every stage is timed and printed as a breakdown, the same numbers are on /metrics.
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from metrics import metrics
+
+startup_seconds = metrics.gauge("translator_startup_seconds", "Seconds each startup stage took", labels=("stage",))
+
+PROCESS_START = time.time()  # import this module first so the breakdown covers the other imports too
+
+
+def sd_notify(state):
+    # minimal sd_notify(3): one datagram to the socket systemd passes in NOTIFY_SOCKET
+    address = os.environ.get("NOTIFY_SOCKET")
+    if not address:
+        return False  # started by hand or with Type=simple
+    if address.startswith("@"):
+        address = "\0" + address[1:]  # abstract socket
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(state.encode("utf-8"))
+    except OSError as e:
+        print(f"[Startup] sd_notify failed: {e}")
+        return False
+    return True
+
+
+class StartupSequence:
+    def __init__(self, t_start=PROCESS_START):
+        self.t_start = t_start
+        self.timings = []  # (stage, seconds) in the order the stages finished
+        self.errors = {}
+        self.threads = []
+        self.ready = threading.Event()  # set once every background stage is done
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.timings.append((stage, seconds))
+        startup_seconds.set(seconds, stage=stage)
+        print(f"[Startup] {stage}: {seconds:.2f} seconds")
+
+    @contextmanager
+    def stage(self, name):
+        # a foreground stage, e.g. GPIO or the mics
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, time.time() - t0)
+
+    def background(self, name, func, *args):
+        def run():
+            t0 = time.time()
+            try:
+                func(*args)
+            except Exception as e:
+                self.errors[name] = e
+                print(f"[Startup] {name} failed: {e}")
+            finally:
+                self.record(name, time.time() - t0)
+
+        thread = threading.Thread(target=run, name=f"startup-{name}", daemon=True)
+        self.threads.append(thread)
+        sd_notify(f"STATUS=Loading {name}")
+        thread.start()
+
+    def wait(self):
+        for thread in self.threads:
+            thread.join()
+        total = time.time() - self.t_start
+        startup_seconds.set(total, stage="total")
+        if self.errors:
+            sd_notify(f"STATUS=Startup failed: {', '.join(self.errors)}")
+            # no READY=1: the service fails and Restart=always tries again
+            raise RuntimeError(f"Startup failed in: {', '.join(self.errors)}")
+        self.ready.set()
+        sd_notify(f"READY=1\nSTATUS=Ready after {total:.1f} seconds")
+        self.report(total)
+
+    def report(self, total):
+        print("[Startup] Breakdown:")
+        for stage, seconds in self.timings:
+            print(f"[Startup]   {stage:<12} {seconds:7.2f} seconds")
+        print(f"[Startup]   {'total':<12} {total:7.2f} seconds (background stages overlap)")
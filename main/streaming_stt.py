@@ -0,0 +1,158 @@
+# Function: transcribe while the button is still held
+# A background thread watches the capture ring buffer, runs a simple energy VAD over it and cuts the
+# speech into segments at pauses. Every finished segment is transcribed right away (final transcript),
+# the segment that is still open is transcribed now and then for a partial transcript.
+# When the button is released only the last segment is left to decode, from the copy of the recording taken then
+# (the always-on ring keeps being overwritten while the job waits). If the VAD never found a segment
+# (e.g. loud background from the first frame on), the whole capture is transcribed instead of dropping it.
+import threading
+import time
+import numpy as np
+from audio_utils import pcm16_to_whisper
+
+
+class EnergyVAD:
+    # frame level speech detector: RMS energy against an adaptive noise floor
+    def __init__(self, sample_rate, frame_ms=30, ratio=3.0, min_rms=200.0):
+        self.frame_len = int(sample_rate * frame_ms / 1000)
+        self.ratio = ratio
+        self.min_rms = min_rms  # int16 scale, quiet rooms still need some energy to count as speech
+        self.noise_floor = None
+
+    def is_speech(self, frame):
+        rms = float(np.sqrt(np.mean(frame.astype(np.float32) ** 2)))
+        if self.noise_floor is None:
+            # capped, a capture that starts with speech or loud noise must not lift the floor above it
+            self.noise_floor = min(rms, self.min_rms)
+        speech = rms > max(self.min_rms, self.noise_floor * self.ratio)
+        if not speech:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms  # follow slow changes of the background
+        return speech
+
+
+def join_transcripts(parts, language):
+    separator = "" if language == "zh" else " "  # Chinese has no spaces between words
+    return separator.join(p for p in parts if p)
+
+
+class StreamingTranscriber:
+    def __init__(self, engine, model, language, on_partial=None, on_final=None,
+                 min_silence=0.5, max_segment=10.0, min_speech=0.3, partial_interval=2.0, poll_interval=0.1):
+        self.engine = engine  # CaptureEngine of the mic that is recording
+        self.model = model
+        self.language = language
+        self.on_partial = on_partial
+        self.on_final = on_final
+        self.vad = EnergyVAD(engine.sample_rate)
+        rate = engine.sample_rate
+        self.min_silence_frames = int(min_silence * rate / self.vad.frame_len)
+        self.max_segment_samples = int(max_segment * rate)
+        self.min_speech_frames = max(1, int(min_speech * rate / self.vad.frame_len))
+        self.partial_interval = partial_interval
+        self.poll_interval = poll_interval
+        self.finals = []
+        self.capture_start = None  # ring position where the recording starts
+        self.segment_start = None  # ring position where the open segment starts
+        self.scan_pos = None       # ring position up to which the VAD has looked
+        self.end_pos = None        # ring position where the recording ended, set on release
+        self.pcm = None            # copy of the recording taken on release, always-on capture overwrites the ring
+        self.pcm_start = None      # ring position of the copy's first sample
+        self.speech_frames = 0
+        self.silence_frames = 0
+        self.last_partial = 0.0
+        self.partial_pos = None    # scan_pos of the last partial, the same audio is not decoded twice
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()  # the thread and finish() never decode at the same time
+
+    def start(self):
+        self.capture_start = self.engine.capture_start
+        self.segment_start = self.engine.capture_start
+        self.scan_pos = self.engine.capture_start
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            with self.lock:
+                end_pos = self.engine.ring.total_written
+                if self.end_pos is not None:
+                    end_pos = min(end_pos, self.end_pos)  # always-on capture keeps writing after the release
+                self.scan(end_pos)
+            time.sleep(self.poll_interval)
+
+    def stop_at(self, end_pos, pcm=None):
+        # called on release: the utterance ends here, audio after it belongs to nobody (or the next press).
+        # The job may wait longer than the ring holds, the rest is then decoded from the copy of the recording.
+        if pcm is not None:
+            self.pcm_start = end_pos - len(pcm) // 2
+            self.pcm = pcm
+        self.end_pos = end_pos
+
+    def read(self, start, end):
+        if self.pcm is not None and start >= self.pcm_start:
+            return np.frombuffer(self.pcm, dtype=np.int16)[start - self.pcm_start:end - self.pcm_start]
+        return self.engine.ring.read(start, end)
+
+    def scan(self, end_pos, final=False):
+        frame_len = self.vad.frame_len * self.engine.channels
+        while (self.running or final) and self.scan_pos + frame_len <= end_pos:
+            frame = self.read(self.scan_pos, self.scan_pos + frame_len)
+            self.scan_pos += frame_len
+            if self.vad.is_speech(frame):
+                self.speech_frames += 1
+                self.silence_frames = 0
+            else:
+                self.silence_frames += 1
+            if self.speech_frames == 0 and self.silence_frames > self.min_silence_frames:
+                self.segment_start = self.scan_pos  # nothing said yet, do not carry leading silence
+                self.silence_frames = 0
+            elif self.speech_frames and (self.silence_frames >= self.min_silence_frames or
+                                         self.scan_pos - self.segment_start >= self.max_segment_samples * self.engine.channels):
+                self.close_segment(self.scan_pos)
+        if not final and self.running and self.on_partial and self.partial_interval and self.speech_frames >= self.min_speech_frames:
+            # after the release only finish() decodes, the tail no longer grows and the slot is needed elsewhere
+            if self.end_pos is None and self.scan_pos != self.partial_pos and \
+                    time.time() - self.last_partial >= self.partial_interval:
+                self.last_partial = time.time()
+                self.partial_pos = self.scan_pos
+                partial = self.transcribe(self.segment_start, self.scan_pos)
+                self.on_partial(join_transcripts(self.finals + [partial], self.language))
+
+    def close_segment(self, end_pos):
+        if self.speech_frames >= self.min_speech_frames:
+            text = self.transcribe(self.segment_start, end_pos)
+            if text:
+                self.finals.append(text)
+                if self.on_final:
+                    self.on_final(text)
+        self.segment_start = end_pos
+        self.speech_frames = 0
+        self.silence_frames = 0
+
+    def transcribe(self, start, end):
+        pcm = self.read(start, end).tobytes()
+        audio = pcm16_to_whisper(pcm, self.engine.sample_rate, self.engine.channels)
+        result = self.model.transcribe(audio, language=self.language)
+        return result["text"].strip()
+
+    def cancel(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+
+    def finish(self, end_pos):
+        # called when the channel worker gets to the utterance: decode what is left up to end_pos, return the transcript
+        self.cancel()
+        with self.lock:
+            self.scan(end_pos, final=True)
+            if self.speech_frames:
+                self.close_segment(end_pos)
+            if not self.finals and end_pos > self.capture_start:
+                text = self.transcribe(self.capture_start, end_pos)  # the VAD found nothing, do not lose the utterance
+                if text:
+                    self.finals.append(text)
+                    if self.on_final:
+                        self.on_final(text)
+        return join_transcripts(self.finals, self.language)
@@ -0,0 +1,159 @@
+# Function: speech-to-text backends, selectable per deployment
+# Every backend loads one Whisper size and offers transcribe(audio, language) -> {"text": ...},
+# the same shape as openai-whisper, so the button scripts do not care which one is used.
+#   whisper      openai-whisper on PyTorch (FP32 on CPU), the original setup. Push-to-talk clips up to
+#                STT_FAST_PATH_SECONDS (default 10, 0 = off) skip transcribe()'s seek loop: silence is trimmed,
+#                the log-mel is computed once and decoded greedily in one window with the language pinned and
+#                no timestamp tokens; higher temperatures are only tried when the result looks unreliable.
+#   ctranslate2  the same Whisper weights converted to CTranslate2, int8 on CPU. Never imports torch: the log-mel
+#                is computed with numpy and the tokenizer is read from the converted model's tokenizer.json.
+# Choose with environment variables, e.g. in system/offline_translator.service:
+#   STT_BACKEND=ctranslate2  STT_COMPUTE_TYPE=int8  STT_INTRA_THREADS=4  STT_INTER_THREADS=1
+# The CTranslate2 model has to be converted once (transformers is already installed):
+#   ct2-transformers-converter --model openai/whisper-tiny --output_dir models/whisper-tiny-ct2 --quantization int8 \
+#       --copy_files tokenizer.json
+import importlib.util
+import os
+import warnings
+import numpy as np
+from audio_utils import WHISPER_SAMPLE_RATE, trim_silence, wav_to_whisper
+
+CT2_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models")
+
+# whisper's feature extraction: 25 ms windows every 10 ms, 30 s (3000 frames) per encoder window
+N_FFT = 400
+HOP_LENGTH = 160
+N_FRAMES = 3000
+
+mel_filter_banks = {}  # n_mels -> filter matrix
+
+# the thresholds and temperature ladder whisper.transcribe uses by default
+FALLBACK_TEMPERATURES = (0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+def mel_filters(n_mels):
+    # the filter bank shipped with openai-whisper, found without importing the package (it imports torch)
+    if n_mels not in mel_filter_banks:
+        package_dir = os.path.dirname(importlib.util.find_spec("whisper").origin)
+        with np.load(os.path.join(package_dir, "assets", "mel_filters.npz")) as f:
+            mel_filter_banks[n_mels] = f[f"mel_{n_mels}"]
+    return mel_filter_banks[n_mels]
+
+
+def log_mel_spectrogram(audio, n_mels=80):
+    # numpy version of whisper.log_mel_spectrogram (periodic Hann window, reflect padding, last frame dropped)
+    audio = np.asarray(audio, dtype=np.float32)
+    if len(audio) <= N_FFT // 2:
+        audio = np.pad(audio, (0, N_FFT // 2 + 1 - len(audio)))
+    padded = np.pad(audio, N_FFT // 2, mode="reflect")
+    count = 1 + (len(padded) - N_FFT) // HOP_LENGTH
+    frames = np.lib.stride_tricks.as_strided(padded, shape=(count, N_FFT),
+                                             strides=(padded.strides[0] * HOP_LENGTH, padded.strides[0]))
+    window = np.hanning(N_FFT + 1)[:-1].astype(np.float32)
+    magnitudes = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+    mel = mel_filters(n_mels) @ magnitudes[:-1].T
+    log_spec = np.log10(np.maximum(mel, 1e-10))
+    log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+    return ((log_spec + 4.0) / 4.0).astype(np.float32)
+
+
+class WhisperBackend:
+    name = "whisper"
+
+    def __init__(self, size, device="cpu", fast_path_seconds=10.0):
+        import whisper  # pulls in torch, only on devices that use this backend
+        warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
+        self.whisper = whisper
+        self.size = size
+        self.model = whisper.load_model(size, device=device)
+        self.fast_path_seconds = fast_path_seconds
+
+    def transcribe(self, audio, language):
+        whisper = self.whisper
+        if isinstance(audio, str):
+            audio = whisper.load_audio(audio)
+        if self.fast_path_seconds and len(audio) <= self.fast_path_seconds * WHISPER_SAMPLE_RATE:
+            return self.transcribe_short(audio, language)
+        return self.model.transcribe(audio, language=language)
+
+    def transcribe_short(self, audio, language):
+        whisper = self.whisper
+        audio = trim_silence(audio)
+        # mel of the clip plus 30 s of padding, cut to one window the way transcribe() cuts its first segment
+        mel = whisper.log_mel_spectrogram(audio, n_mels=self.model.dims.n_mels, padding=whisper.audio.N_SAMPLES)
+        content_frames = mel.shape[-1] - whisper.audio.N_FRAMES
+        mel = whisper.pad_or_trim(mel[:, :content_frames], whisper.audio.N_FRAMES).to(self.model.device)
+        fp16 = self.model.device.type == "cuda"
+        for temperature in (0.0,) + FALLBACK_TEMPERATURES:
+            options = whisper.DecodingOptions(task="transcribe", language=language, temperature=temperature,
+                                              without_timestamps=True, fp16=fp16)
+            result = whisper.decode(self.model, mel, options)
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                return {"text": "", "language": language}  # nothing said, another temperature will not help
+            if result.compression_ratio <= COMPRESSION_RATIO_THRESHOLD and result.avg_logprob >= LOGPROB_THRESHOLD:
+                break
+            print(f"[STT] Low confidence at temperature {temperature} (avg logprob {result.avg_logprob:.2f})")
+        return {"text": result.text, "language": language}
+
+
+class CTranslate2WhisperBackend:
+    name = "ctranslate2"
+
+    def __init__(self, size, device="cpu", model_dir=None, compute_type="int8", intra_threads=0, inter_threads=1,
+                 beam_size=1):
+        import ctranslate2  # only needed on devices that use this backend
+        self.ctranslate2 = ctranslate2
+        self.size = size
+        self.model_path = model_dir or os.path.join(CT2_MODEL_DIR, f"whisper-{size}-ct2")
+        if not os.path.isdir(self.model_path):
+            raise FileNotFoundError(f"CTranslate2 Whisper model not found: {self.model_path} (convert it first)")
+        self.model = ctranslate2.models.Whisper(self.model_path, device=device, compute_type=compute_type,
+                                                intra_threads=intra_threads, inter_threads=inter_threads)
+        self.beam_size = beam_size
+        self.n_mels = getattr(self.model, "n_mels", 80)
+        tokenizer_path = os.path.join(self.model_path, "tokenizer.json")
+        if not os.path.exists(tokenizer_path):
+            raise FileNotFoundError(f"{tokenizer_path} missing (convert with --copy_files tokenizer.json)")
+        from tokenizers import Tokenizer
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.eot = self.tokenizer.token_to_id("<|endoftext|>")  # text tokens come before it, special tokens after
+
+    def prompt(self, language):
+        # language is pinned, no detection pass and no timestamp tokens
+        tokens = ["<|startoftranscript|>"]
+        if self.model.is_multilingual:
+            tokens += [f"<|{language}|>", "<|transcribe|>"]
+        tokens.append("<|notimestamps|>")
+        return [self.tokenizer.token_to_id(token) for token in tokens]
+
+    def transcribe(self, audio, language):
+        if isinstance(audio, str):
+            audio = wav_to_whisper(audio)
+        prompt = self.prompt(language)
+        mel = log_mel_spectrogram(audio, n_mels=self.n_mels)
+        texts = []
+        # the encoder always takes 30 s windows
+        for start in range(0, max(mel.shape[-1], 1), N_FRAMES):
+            window = mel[:, start:start + N_FRAMES]
+            window = np.pad(window, ((0, 0), (0, N_FRAMES - window.shape[-1])))
+            features = self.ctranslate2.StorageView.from_array(np.ascontiguousarray(window[np.newaxis], dtype=np.float32))
+            result = self.model.generate(features, [prompt], beam_size=self.beam_size)[0]
+            tokens = [t for t in result.sequences_ids[0] if t < self.eot]
+            texts.append(self.tokenizer.decode(tokens).strip())
+        return {"text": " ".join(t for t in texts if t), "language": language}
+
+def create_backend(name, size, device="cpu"):
+    if name == "whisper":
+        return WhisperBackend(size, device=device,
+                              fast_path_seconds=float(os.environ.get("STT_FAST_PATH_SECONDS", "10")))
+    if name == "ctranslate2":
+        return CTranslate2WhisperBackend(size, device=device,
+                                         model_dir=os.environ.get("STT_MODEL_DIR"),
+                                         compute_type=os.environ.get("STT_COMPUTE_TYPE", "int8"),
+                                         intra_threads=int(os.environ.get("STT_INTRA_THREADS", "0")),
+                                         inter_threads=int(os.environ.get("STT_INTER_THREADS", "1")),
+                                         beam_size=int(os.environ.get("STT_BEAM_SIZE", "1")))
+    raise ValueError(f"Unknown STT backend: {name} (use 'whisper' or 'ctranslate2')")
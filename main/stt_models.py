@@ -0,0 +1,61 @@
+# Function: process-wide Whisper model registry
+# Every model size is loaded once (at service start) and the same resident model is shared by
+# button1 (guest mic) and button2 (user mic), instead of calling whisper.load_model on every release.
+# The backend (openai-whisper or CTranslate2) is chosen per deployment with STT_BACKEND, see stt_backends.py.
+import os
+import threading
+import time
+import numpy as np
+from memory_usage import get_rss_mb
+
+STT_BACKEND = os.environ.get("STT_BACKEND", "whisper")
+
+
+class STTModelRegistry:
+    def __init__(self, backend=None, device="cpu"):
+        self.backend = backend or STT_BACKEND
+        self.device = device
+        self.models = {}
+        self.load_times = {}  # size -> seconds spent loading
+        self.load_rss = {}    # size -> MB of RSS added by loading
+        self.lock = threading.Lock()
+
+    def preload(self, sizes, warmup=False):
+        for size in sizes:
+            self.get(size)
+            if warmup:
+                self.warmup(size)
+        self.report()
+
+    def warmup(self, size, language="en"):
+        # one second of silence runs the whole decode path once, so the first press does not pay for it
+        t0 = time.time()
+        self.get(size).transcribe(np.zeros(16000, dtype=np.float32), language=language)
+        print(f"[STT] Warm-up of '{size}' took {time.time() - t0:.2f} seconds")
+
+    def get(self, size="tiny"):
+        with self.lock:  # two buttons released at the same time must not load the same model twice
+            model = self.models.get(size)
+            if model is None:
+                from stt_backends import create_backend  # only once a model is needed
+                rss_before = get_rss_mb()
+                t0 = time.time()
+                model = create_backend(self.backend, size, device=self.device)
+                self.load_times[size] = time.time() - t0
+                self.load_rss[size] = get_rss_mb() - rss_before
+                self.models[size] = model
+                print(f"[STT] Loaded {self.backend} '{size}' on {self.device} in {self.load_times[size]:.2f} seconds "
+                      f"(+{self.load_rss[size]:.0f} MB RSS)")
+        return model
+
+    def is_loaded(self, size):
+        return size in self.models
+
+    def report(self):
+        for size in self.models:
+            print(f"[STT] {self.backend} '{size}': load {self.load_times[size]:.2f} seconds, +{self.load_rss[size]:.0f} MB")
+        print(f"[STT] Process RSS: {get_rss_mb():.0f} MB")
+
+
+# shared by the whole process
+stt_registry = STTModelRegistry()
@@ -1,4 +1,4 @@
-from transformers import MarianMTModel, MarianTokenizer
+from marian_engine import create_marian_engine
 from gpiozero import Button
 from signal import pause
 import os
@@ -53,20 +53,13 @@ def select_target():
     print(f"Selected target language: {lang}")
     play_audio(lang)
 
-def translate_text(source_lang_code, target_lang_code, text):
-    model_name = f"Helsinki-NLP/opus-mt-{source_lang_code}-{target_lang_code}"
+translation_engine = create_marian_engine(language_codes) # each pair is loaded on its first translation and then kept
 
+def translate_text(source_lang_code, target_lang_code, text):
     try:
-        tokenizer = MarianTokenizer.from_pretrained(model_name)
-        model = MarianMTModel.from_pretrained(model_name)
+        return translation_engine.translate(source_lang_code, target_lang_code, text)
     except Exception as e:
-        return f"Error loading model '{model_name}': {str(e)}"
-
-    inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True)
-    translated_tokens = model.generate(**inputs)
-    translation = tokenizer.decode(translated_tokens[0], skip_special_tokens=True)
-
-    return translation
+        return f"Translation error: {str(e)}"
 
 def manual_translate():
     source = selected_langs['source']
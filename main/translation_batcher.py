@@ -0,0 +1,90 @@
+# Function: micro-batching of translation requests for the same language pair
+# When both channels (or several callers) translate close together, each call would run its own decode.
+# Requests for one pair are collected for a short window (first request + window_seconds) or until
+# max_batch sentences are waiting, then translated with one batched call and the results handed back to
+# each caller's future. A lone request only waits the window, e.g. 20 ms next to a translation of 0.3 s or more.
+#   translator_translation_batch_sentences   histogram of sentences per batched call, on /metrics
+import collections
+import threading
+import time
+from concurrent.futures import Future
+from metrics import metrics
+
+batch_sentences = metrics.histogram("translator_translation_batch_sentences", "Sentences per batched translation call",
+                                    labels=("pair",), buckets=(1, 2, 4, 8, 16, 32, 64))
+
+
+class TranslationBatcher:
+    def __init__(self, translate_sentences, window_seconds=0.02, max_batch=16):
+        self.translate_sentences = translate_sentences  # translate_sentences(source, target, sentences) -> list or None
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.pending = collections.defaultdict(collections.deque)  # (source, target) -> deque of (sentences, future, time)
+        self.workers = {}  # (source, target) -> thread, one decode per pair at a time
+        self.condition = threading.Condition()
+        self.closed = False
+
+    def submit(self, source, target, sentences):
+        future = Future()
+        pair = (source, target)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Translation batcher is closed")
+            self.pending[pair].append((list(sentences), future, time.time()))
+            if pair not in self.workers:
+                self.workers[pair] = threading.Thread(target=self.run, args=(pair,), daemon=True)
+                self.workers[pair].start()
+            self.condition.notify_all()
+        return future
+
+    def translate(self, source, target, sentences):
+        return self.submit(source, target, sentences).result()
+
+    def waiting_sentences(self, pair):
+        return sum(len(sentences) for sentences, _, _ in self.pending[pair])
+
+    def next_batch(self, pair):
+        # blocks until a batch is due, returns the requests in it (None once closed)
+        with self.condition:
+            while not self.pending[pair] and not self.closed:
+                self.condition.wait()
+            if not self.pending[pair]:
+                return None
+            deadline = self.pending[pair][0][2] + self.window_seconds
+            while self.waiting_sentences(pair) < self.max_batch and not self.closed:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            requests, count = [], 0
+            while self.pending[pair]:
+                sentences = self.pending[pair][0][0]
+                if requests and count + len(sentences) > self.max_batch:
+                    break  # the rest goes into the next batch, a request is never split
+                requests.append(self.pending[pair].popleft())
+                count += len(sentences)
+            return requests
+
+    def run(self, pair):
+        while True:
+            requests = self.next_batch(pair)
+            if requests is None:
+                return
+            sentences = [sentence for request in requests for sentence in request[0]]
+            batch_sentences.observe(len(sentences), pair=f"{pair[0]}_{pair[1]}")
+            try:
+                translations = self.translate_sentences(pair[0], pair[1], sentences)
+            except Exception as e:
+                for _, future, _ in requests:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for request_sentences, future, _ in requests:
+                end = start + len(request_sentences)
+                future.set_result(None if translations is None else translations[start:end])
+                start = end
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
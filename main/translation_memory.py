@@ -0,0 +1,165 @@
+# Function: translation memory, answers repeated sentences without running the translation model
+# Every translated sentence is stored per language pair in a small SQLite file, so the memory survives
+# restarts. A lookup first tries the exact (normalized) sentence, then a fuzzy match: a stored sentence with
+# exactly the same words once punctuation and filler words ("um", "äh", "嗯") are ignored. Anything looser is
+# not safe on a live interpreter: by characters "The door is not open." is close to "The door is now open.",
+# and "Berlin" to "Bern". Fuzzy matching can be switched off (TRANSLATION_MEMORY_FUZZY=0).
+# The memory is bounded, the least recently used sentences are evicted.
+#   translator_translation_memory_requests_total{pair, result="exact|fuzzy|miss"}   on /metrics
+import collections
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from metrics import metrics
+
+TRANSLATION_MEMORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "translation_memory.sqlite")
+
+memory_requests = metrics.counter("translator_translation_memory_requests_total",
+                                  "Translation memory lookups by language pair and result", labels=("pair", "result"))
+memory_entries = metrics.gauge("translator_translation_memory_entries", "Sentences held by the translation memory")
+
+
+def normalize(text):
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+# hesitations that never change the meaning; "so", "well", "also" or "啊" can, so they stay
+FILLER_WORDS = {
+    "en": {"um", "umm", "uh", "uhm", "er", "erm", "hmm", "mm"},
+    "de": {"äh", "ähm", "öh", "öhm", "hm", "hmm", "mhm"},
+    "zh": {"嗯", "呃"},
+}
+
+
+def content_key(text, language):
+    # the words of a normalized sentence without punctuation and fillers, Chinese per character;
+    # a question stays a question ("Bern?" is not "Bern.")
+    if language == "zh":
+        words = [c for c in text if c.isalnum()]
+    else:
+        words = re.findall(r"\w+(?:[.,]\d+)?", text)  # "2.5" stays one word
+    fillers = FILLER_WORDS.get(language, ())
+    words = [w for w in words if w not in fillers]
+    if words and text.rstrip().endswith(("?", "？")):
+        words.append("?")
+    return " ".join(words)
+
+
+class TranslationMemory:
+    def __init__(self, path=TRANSLATION_MEMORY_PATH, max_entries=20000, fuzzy=True):
+        self.path = path
+        self.max_entries = max_entries
+        self.fuzzy_matching = fuzzy
+        self.entries = collections.OrderedDict()  # (pair, normalized source) -> translation, most recent last
+        self.index = collections.defaultdict(set)  # (pair, content key) -> normalized sources with those words
+        self.lock = threading.Lock()
+        self.db = None
+
+    def load(self):
+        t0 = time.time()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # losing the last sentence on a power cut is fine
+        self.db.execute("CREATE TABLE IF NOT EXISTS memory (pair TEXT, source TEXT, translation TEXT, "
+                        "last_used REAL, PRIMARY KEY (pair, source))")
+        rows = self.db.execute("SELECT pair, source, translation FROM memory ORDER BY last_used").fetchall()
+        with self.lock:
+            for pair, source, translation in rows:
+                self.insert(pair, source, translation)
+            evicted = self.evict()  # max_entries may have been lowered since the last run
+            self.db.executemany("DELETE FROM memory WHERE pair = ? AND source = ?", evicted)
+            self.db.commit()
+        memory_entries.set(len(self.entries))
+        print(f"[Translation memory] {len(self.entries)} sentences loaded in {time.time() - t0:.2f} seconds")
+
+    def key(self, pair, source):
+        return (pair, content_key(source, pair.split("_")[0]))
+
+    def insert(self, pair, source, translation):
+        self.entries[(pair, source)] = translation
+        self.index[self.key(pair, source)].add(source)
+
+    def remove(self, pair, source):
+        del self.entries[(pair, source)]
+        key = self.key(pair, source)
+        sources = self.index.get(key)
+        if sources is not None:
+            sources.discard(source)
+            if not sources:
+                del self.index[key]
+
+    def evict(self):
+        evicted = []
+        while len(self.entries) > self.max_entries:
+            pair, source = next(iter(self.entries))
+            self.remove(pair, source)
+            evicted.append((pair, source))
+        return evicted
+
+    def fuzzy(self, pair, source):
+        key = self.key(pair, source)
+        if not key[1]:
+            return None  # only punctuation or fillers, nothing to match on
+        sources = self.index.get(key)
+        return next(iter(sources)) if sources else None
+
+    def lookup(self, source_lang, target_lang, text):
+        pair = f"{source_lang}_{target_lang}"
+        source = normalize(text)
+        with self.lock:
+            match, result = None, "miss"
+            if (pair, source) in self.entries:
+                match, result = source, "exact"
+            elif source and self.fuzzy_matching:
+                match = self.fuzzy(pair, source)
+                result = "fuzzy" if match else "miss"
+            translation = None
+            if match:
+                self.entries.move_to_end((pair, match))
+                translation = self.entries[(pair, match)]
+        memory_requests.inc(pair=pair, result=result)
+        if match:
+            self.touch(pair, match)
+            if result == "fuzzy":
+                print(f"[Translation memory] '{text}' ~ '{match}'")
+        return translation
+
+    def add(self, source_lang, target_lang, text, translation):
+        pair = f"{source_lang}_{target_lang}"
+        source = normalize(text)
+        if not source or not translation:
+            return
+        with self.lock:
+            if (pair, source) in self.entries:
+                self.remove(pair, source)
+            self.insert(pair, source, translation)
+            evicted = self.evict()
+        memory_entries.set(len(self.entries))
+        if self.db is None:
+            return
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO memory VALUES (?, ?, ?, ?)", (pair, source, translation, time.time()))
+            self.db.executemany("DELETE FROM memory WHERE pair = ? AND source = ?", evicted)
+            self.db.commit()
+
+    def touch(self, pair, source):
+        if self.db is None:
+            return
+        with self.lock:
+            self.db.execute("UPDATE memory SET last_used = ? WHERE pair = ? AND source = ?", (time.time(), pair, source))
+            self.db.commit()
+
+    def report(self):
+        hits = sum(v for (pair, result), v in memory_requests.values.items() if result != "miss")
+        total = sum(memory_requests.values.values())
+        if total:
+            print(f"[Translation memory] {hits:.0f}/{total:.0f} sentences without the model ({100 * hits / total:.0f}%)")
+
+    def close(self):
+        if self.db is not None:
+            with self.lock:
+                self.db.close()
+                self.db = None
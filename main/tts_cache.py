@@ -0,0 +1,155 @@
+# Function: cache of synthesized replies, so phrases the counter staff repeat all day skip piper
+# The key is a hash of everything that changes the audio: voice model, the voice config (hashed),
+# inference parameters and the normalized text. Audio is kept as WAV files on disk (survives restarts)
+# and the most recent clips also in memory; both tiers are size-bounded and evict least recently used.
+#   translator_tts_cache_requests_total{result="memory|disk|miss"}   on /metrics
+import collections
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+import wave
+from audio_utils import write_wav
+from metrics import metrics
+
+TTS_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tts_cache")
+
+cache_requests = metrics.counter("translator_tts_cache_requests_total", "TTS cache lookups by result", labels=("result",))
+cache_bytes = metrics.gauge("translator_tts_cache_bytes", "Bytes of audio held by the TTS cache", labels=("tier",))
+
+config_digests = {}  # config path -> sha256, the voice configs do not change while the service runs
+
+
+def normalize_text(text):
+    # the same sentence with different spacing or full-width characters sounds the same
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def file_digest(path):
+    if path not in config_digests:
+        with open(path, "rb") as f:
+            config_digests[path] = hashlib.sha256(f.read()).hexdigest()
+    return config_digests[path]
+
+
+def cache_key(model_path, config_path, params, text):
+    identity = {"model": os.path.basename(model_path),
+                "config": file_digest(config_path),
+                "params": params,
+                "text": normalize_text(text)}
+    return hashlib.sha256(json.dumps(identity, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    def __init__(self, folder=TTS_CACHE_DIR, memory_bytes=32 * 1024 * 1024, disk_bytes=512 * 1024 * 1024,
+                 max_text_length=200):
+        self.folder = folder
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_text_length = max_text_length  # long explanations are rarely repeated word for word
+        self.memory = collections.OrderedDict()  # key -> (pcm, sample_rate), most recent last
+        self.memory_size = 0
+        self.disk = collections.OrderedDict()    # key -> file size, most recent last
+        self.disk_size = 0
+        self.lock = threading.Lock()
+
+    def load_index(self):
+        # what is already on disk from earlier runs, oldest access first
+        os.makedirs(self.folder, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(".wav"):
+                path = os.path.join(self.folder, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        with self.lock:
+            for _, key, size in sorted(entries):
+                self.disk[key] = size
+                self.disk_size += size
+        cache_bytes.set(self.disk_size, tier="disk")
+        print(f"[TTS cache] {len(self.disk)} clips on disk ({self.disk_size / 1024 / 1024:.1f} MB)")
+
+    def cacheable(self, text):
+        return 0 < len(text) <= self.max_text_length
+
+    def path(self, key):
+        return os.path.join(self.folder, key + ".wav")
+
+    def get(self, key):
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                cache_requests.inc(result="memory")
+                return entry
+            on_disk = key in self.disk
+            if on_disk:
+                self.disk.move_to_end(key)
+        if on_disk:
+            try:
+                with wave.open(self.path(key), "rb") as wf:
+                    entry = (wf.readframes(wf.getnframes()), wf.getframerate())
+                os.utime(self.path(key))  # disk LRU order after a restart
+            except (OSError, EOFError, wave.Error):
+                self.forget(key)
+                entry = None
+            if entry is not None:
+                self.remember(key, entry)
+                cache_requests.inc(result="disk")
+                return entry
+        cache_requests.inc(result="miss")
+        return None
+
+    def put(self, key, pcm, sample_rate):
+        if not pcm:
+            return
+        self.remember(key, (pcm, sample_rate))
+        threading.Thread(target=self.store, args=(key, pcm, sample_rate), daemon=True).start()
+
+    def remember(self, key, entry):
+        with self.lock:
+            if key in self.memory:
+                return
+            self.memory[key] = entry
+            self.memory_size += len(entry[0])
+            while self.memory_size > self.memory_bytes and len(self.memory) > 1:
+                _, (old_pcm, _) = self.memory.popitem(last=False)
+                self.memory_size -= len(old_pcm)
+        cache_bytes.set(self.memory_size, tier="memory")
+
+    def store(self, key, pcm, sample_rate):
+        # written under a temporary name first, a power cut never leaves a half clip behind
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            write_wav(tmp_path, pcm, sample_rate)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"[TTS cache] Could not store clip: {e}")
+            return
+        evicted = []
+        with self.lock:
+            self.disk_size += size - self.disk.pop(key, 0)
+            self.disk[key] = size
+            while self.disk_size > self.disk_bytes and len(self.disk) > 1:
+                old_key, old_size = self.disk.popitem(last=False)
+                self.disk_size -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self.path(old_key))
+            except OSError:
+                pass
+        cache_bytes.set(self.disk_size, tier="disk")
+
+    def forget(self, key):
+        with self.lock:
+            self.disk_size -= self.disk.pop(key, 0)
+
+    def report(self):
+        hits = cache_requests.get(result="memory") + cache_requests.get(result="disk")
+        total = hits + cache_requests.get(result="miss")
+        if total:
+            print(f"[TTS cache] {hits:.0f}/{total:.0f} hits ({100 * hits / total:.0f}%)")